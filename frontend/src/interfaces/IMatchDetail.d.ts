@@ -6,4 +6,6 @@ export interface IMatchDetail {
   line_number1: number;
   line_number2: number;
   has_variable_changes: boolean;
+  cell1?: number;
+  cell2?: number;
 }
\ No newline at end of file
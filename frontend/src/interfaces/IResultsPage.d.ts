@@ -0,0 +1,28 @@
+import { IMatchDetail } from "./IMatchDetail";
+import { IPlagiarsmResult } from "./IPlagiarsmResult";
+
+export interface ISourceFile {
+  id: number;
+  user: string;
+  filename: string;
+  code: string;
+}
+
+// Compact results refer to ISourceFile ids and line spans instead of carrying code
+export interface ICompactResult
+  extends Omit<IPlagiarsmResult, "originalCode1" | "originalCode2" | "similar_segments" | "match_details"> {
+  file1_id: number;
+  file2_id: number;
+  similar_segments?: string[];
+  match_details?: Omit<IMatchDetail, "segment" | "segment2">[];
+}
+
+export interface IResultsPage {
+  page: number;
+  per_page: number;
+  total_results: number;
+  total_pages: number;
+  summary: Record<string, unknown>;
+  results: ICompactResult[];
+  files: ISourceFile[];
+}
\ No newline at end of file
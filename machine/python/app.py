@@ -1,21 +1,117 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_file
 from flask_cors import CORS
+import cProfile
 import os
 from pathlib import Path
-from checker import check_plagiarism_files
-from datetime import datetime
+from checker import DETECTION_ENGINES, check_plagiarism_files, check_corpus_submissions
+from helper.cache import SubmissionCache
+from helper.corpus import AssignmentCorpus
+from helper.extractor import SpooledSubmission
+from helper.jobs import JobQueueFull, JobScheduler
+from helper.metrics import MetricsRegistry
+from helper.report import RESULT_FORMATS, RESULTS_PAGE_SIZE, encode_payload, results_page
+from helper.progress import VERBOSITY_LEVELS, is_visible
+from functools import partial
 import json
-import queue
-import threading
 
 app = Flask(__name__)
 CORS(app)
 
-progress_queues = {}
+# Persistent per-assignment corpora for incremental checks
+CORPUS_FOLDER = Path(__file__).parent.parent / 'data' / 'corpus'
 
-# Update paths to be relative to the machine directory
-UPLOAD_FOLDER = Path(__file__).parent.parent / 'data' / 'answer'
-UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+# Content-addressed cache of normalized submissions shared by all checks
+CACHE_PATH = Path(__file__).parent.parent / 'data' / 'cache' / 'submissions.sqlite3'
+CACHE_MAX_BYTES = int(os.environ.get('PLAGIARISM_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+submission_cache = SubmissionCache(CACHE_PATH, max_bytes=CACHE_MAX_BYTES)
+
+# Worker processes per check unless the upload asks for a different count,
+# and the most an upload may ask for
+MAX_WORKERS = int(os.environ.get('PLAGIARISM_MAX_WORKERS', os.cpu_count() or 1))
+DEFAULT_WORKERS = int(os.environ.get('PLAGIARISM_WORKERS', min(os.cpu_count() or 1, MAX_WORKERS)))
+
+# Checks run at once, and checks allowed to wait before uploads get a 429
+JOB_WORKERS = int(os.environ.get('PLAGIARISM_JOB_WORKERS', 2))
+JOB_QUEUE_SIZE = int(os.environ.get('PLAGIARISM_JOB_QUEUE_SIZE', 16))
+JOB_RETRY_AFTER = 30
+scheduler = JobScheduler(workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE)
+
+# Seconds without events after which the threaded /progress stream gives up
+PROGRESS_TIMEOUT = 30
+
+# Seconds between coalesced progress snapshots of a running check
+PROGRESS_INTERVAL = float(os.environ.get('PLAGIARISM_PROGRESS_INTERVAL', 1.0))
+
+# Stage timings and counters summed over all finished checks, served at /metrics
+metrics_registry = MetricsRegistry()
+
+# cProfile dumps of checks uploaded with profile=true
+PROFILE_FOLDER = Path(__file__).parent.parent / 'data' / 'profiles'
+
+def form_flag(value):
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+def read_uploaded_files(files):
+    """Wrap uploads in spooled buffers so nothing is written to the upload folder"""
+    return [SpooledSubmission(file.filename, file.stream) for file in files]
+
+def read_check_options():
+    """Check options from the upload form"""
+    return {
+        # Number of worker processes used for the pairwise comparison
+        'workers': min(max(1, request.form.get('workers', default=DEFAULT_WORKERS, type=int)), MAX_WORKERS),
+        # Detection engine, see checker.DETECTION_ENGINES
+        'engine': request.form.get('engine', default='lines'),
+        # Ignore content shared by more than this fraction of submissions
+        'boilerplate_threshold': request.form.get('boilerplate_threshold', default=None, type=float),
+        # Events recorded for the job, see helper.progress.VERBOSITY_LEVELS
+        'verbosity': request.form.get('verbosity', default='normal'),
+        'progress_interval': PROGRESS_INTERVAL,
+        # Dump a cProfile of the job to PROFILE_FOLDER
+        'profile': request.form.get('profile', default=False, type=form_flag),
+        # 'compact' sends each file's code once, see helper.report
+        'result_format': request.form.get('result_format', default='full')
+    }
+
+def format_event(event):
+    """Server-sent event frame for one progress event"""
+    return f"data: {json.dumps(event)}\n\n"
+
+def start_session(submissions, options, corpus=None, templates=()):
+    """Queue a check job and return the session response (the job id)"""
+    uploads = list(submissions) + list(templates)
+    
+    def close_uploads():
+        for upload in uploads:
+            upload.close()
+    
+    if options['engine'] not in DETECTION_ENGINES:
+        close_uploads()
+        return jsonify({'error': f"Unknown detection engine: {options['engine']}"}), 400
+    if options['result_format'] not in RESULT_FORMATS:
+        close_uploads()
+        return jsonify({'error': f"Unknown result format: {options['result_format']}"}), 400
+    if options['verbosity'] not in VERBOSITY_LEVELS:
+        close_uploads()
+        return jsonify({'error': f"Unknown verbosity: {options['verbosity']}"}), 400
+    
+    try:
+        job = scheduler.submit(
+            process_files_with_progress, submissions, options, corpus, templates,
+            cleanup=close_uploads
+        )
+    except JobQueueFull as e:
+        # Backpressure: tell the client to come back instead of piling up work
+        close_uploads()
+        response = jsonify({'error': f'Server busy, try again later ({e})'})
+        response.headers['Retry-After'] = str(JOB_RETRY_AFTER)
+        return response, 429
+    except Exception as e:
+        # Cleanup on error
+        close_uploads()
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({"session_id": job.id})
 
 @app.route('/check-plagiarism', methods=['POST'])
 def handle_upload():
@@ -23,61 +119,155 @@ def handle_upload():
         return jsonify({'error': 'No files provided'}), 400
     
     files = request.files.getlist('files')
+    # Optional lecturer template files subtracted from every submission
+    templates = request.files.getlist('templates')
     
-    # Create a temporary folder for this session
-    session_folder = UPLOAD_FOLDER / f'temp_session_{datetime.now().strftime("%Y%m%d_%H%M%S")}'
-    session_folder.mkdir(parents=True, exist_ok=True)
+    return start_session(read_uploaded_files(files), read_check_options(),
+                         templates=read_uploaded_files(templates))
+
+@app.route('/assignments/<assignment_id>/submissions', methods=['POST'])
+def handle_corpus_upload(assignment_id):
+    """Add (late) submissions to an assignment and compare only the new ones"""
+    if 'files' not in request.files:
+        return jsonify({'error': 'No files provided'}), 400
     
-    # Save uploaded files maintaining folder structure
-    saved_files = []
-    for file in files:
-        # Create subdirectories if they don't exist
-        file_path = session_folder / file.filename
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Save the file
-        file.save(str(file_path))
-        saved_files.append(file_path)
+    try:
+        corpus = AssignmentCorpus(CORPUS_FOLDER, assignment_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    files = request.files.getlist('files')
+    
+    return start_session(read_uploaded_files(files), read_check_options(), corpus=corpus)
+
+@app.route('/assignments/<assignment_id>/templates', methods=['POST'])
+def handle_template_upload(assignment_id):
+    """Register lecturer template files; the next check re-runs the whole corpus"""
+    if 'files' not in request.files:
+        return jsonify({'error': 'No files provided'}), 400
     
     try:
-        # Create a unique session ID
-        session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        progress_queues[session_id] = queue.Queue()
-        
-        # Start processing in a separate thread 
-        thread = threading.Thread(
-            target=process_files_with_progress,
-            args=(saved_files, session_id, progress_queues[session_id])
-        )
-        thread.start()
-        
-        return jsonify({"session_id": session_id})
-    except Exception as e:
-        # Cleanup on error
-        import shutil
-        shutil.rmtree(str(session_folder))
-        return jsonify({'error': str(e)}), 500
+        corpus = AssignmentCorpus(CORPUS_FOLDER, assignment_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    uploads = read_uploaded_files(request.files.getlist('files'))
+    try:
+        with corpus.lock():
+            added = corpus.add_templates(uploads)
+    finally:
+        for upload in uploads:
+            upload.close()
+    return jsonify({'templates': [path.name for path in added]})
+
+@app.route('/assignments/<assignment_id>/report', methods=['GET'])
+def get_corpus_report(assignment_id):
+    try:
+        corpus = AssignmentCorpus(CORPUS_FOLDER, assignment_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    report = corpus.load_report()
+    if report is None:
+        return jsonify({'error': 'No report for this assignment'}), 404
+    return jsonify(report)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.describe())
+
+@app.route('/jobs/<job_id>/profile', methods=['GET'])
+def get_job_profile(job_id):
+    """cProfile stats of a job started with profile=true (pstats format)"""
+    path = PROFILE_FOLDER / f"{job_id}.prof"
+    if not job_id.isalnum() or not path.exists():
+        return jsonify({'error': 'No profile for this job'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=path.name)
+
+def job_report(job):
+    """Report carried by the job's complete event, or None while it runs"""
+    for event in reversed(job.events_since(0)):
+        if isinstance(event, dict) and event.get('status') == 'complete':
+            return event['results']
+    return None
+
+@app.route('/results/<job_id>', methods=['GET'])
+def get_results(job_id):
+    """One page of a finished job's results in the compact format.
+
+    ?page= and ?per_page= select the page; only the files referenced on it
+    are sent. The body is gzipped when the client accepts it, and
+    MessagePack when it asks for application/msgpack (if installed).
+    """
+    job = scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    report = job_report(job)
+    if report is None:
+        return jsonify({'error': 'Job has no results yet'}), 409
+    
+    page = results_page(
+        report,
+        page=request.args.get('page', default=1, type=int),
+        per_page=request.args.get('per_page', default=RESULTS_PAGE_SIZE, type=int)
+    )
+    binary = request.accept_mimetypes.best_match(['application/json', 'application/msgpack']) == 'application/msgpack'
+    compress = 'gzip' in request.accept_encodings
+    body, mimetype = encode_payload(page, binary=binary, compress=compress)
+    response = Response(body, mimetype=mimetype)
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of the check metrics and the job queue"""
+    gauges = {
+        'jobs_queued': scheduler.queued(),
+        'jobs_running': scheduler.running()
+    }
+    return Response(metrics_registry.render(gauges), mimetype='text/plain; version=0.0.4')
 
 @app.route('/progress/<session_id>', methods=['GET'])
 def get_progress(session_id):
+    """Threaded progress stream for the development server.
+
+    Each watcher holds a worker thread here; under asgi.application the
+    same path is served by a non-blocking endpoint instead. The verbosity
+    query parameter filters the job's events (quiet, normal or verbose).
+    """
+    job = scheduler.get(session_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    verbosity = request.args.get('verbosity', default='normal')
+    
     def generate():
-        q = progress_queues.get(session_id)
-        if not q:
-            return
-            
+        position = 0
         while True:
-            try:
-                progress = q.get(timeout=30)  # 30 second timeout
-                if progress == "DONE":
-                    del progress_queues[session_id]
-                    break
-                yield f"data: {json.dumps(progress)}\n\n"
-            except queue.Empty:
-                break
+            events = job.wait_events(position, timeout=PROGRESS_TIMEOUT)
+            if not events:
+                break  # Job done, or no progress for PROGRESS_TIMEOUT seconds
+            position += len(events)
+            for event in events:
+                if is_visible(event, verbosity):
+                    yield format_event(event)
             
     return Response(generate(), mimetype='text/event-stream')
 
-def process_files_with_progress(files, session_id, progress_queue):
+def process_files_with_progress(progress_queue, files, options, corpus=None, templates=()):
+    """Job body: run one check, reporting progress and the results to the job
+
+    With options['profile'] the check runs under cProfile and the stats are
+    written to PROFILE_FOLDER/<job id>.prof; comparison worker processes
+    (workers > 1) are not included.
+    """
+    options = dict(options)
+    profiler = cProfile.Profile() if options.pop('profile', False) else None
     try:
         # Add initial processing status
         progress_queue.put({
@@ -89,19 +279,41 @@ def process_files_with_progress(files, session_id, progress_queue):
             }
         })
 
-        results = check_plagiarism_files(
+        # Corpus uploads are checked incrementally against earlier submissions
+        # and use the templates stored with the assignment
+        if corpus:
+            check = partial(check_corpus_submissions, corpus)
+        else:
+            check = partial(check_plagiarism_files, template_paths=templates)
+        if profiler:
+            profiler.enable()
+        results = check(
             files, 
             progress_queue=progress_queue,
+            cache=submission_cache,
+            **options,
             callback=lambda detail: progress_queue.put({
                 "status": "processing",
                 "analysisDetail": detail
+            }),
+            # Matches are streamed as they enter the top results, without code
+            result_callback=lambda match: progress_queue.put({
+                "status": "processing",
+                "match": match
             })
         )
+        if profiler:
+            profiler.disable()
+            PROFILE_FOLDER.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(PROFILE_FOLDER / f"{progress_queue.id}.prof")
+        metrics_registry.record(results['summary'].get('metrics', {}))
         
         # Store final results with summary
         progress_queue.put({
             "status": "complete",
             "results": results,
+            # Paginated, compressed access to the same results
+            "resultsUrl": f"/results/{progress_queue.id}",
             "analysisDetail": {
                 "type": "summary",
                 "message": "Analysis complete",
@@ -109,9 +321,10 @@ def process_files_with_progress(files, session_id, progress_queue):
                 "highestSimilarity": max([r["similarity"] for r in results["results"]]) if results["results"] else 0
             }
         })
-        progress_queue.put("DONE")
         
     except Exception as e:
+        if profiler:
+            profiler.disable()
         progress_queue.put({
             "status": "error",
             "message": str(e),
@@ -120,7 +333,8 @@ def process_files_with_progress(files, session_id, progress_queue):
                 "message": f"Error during analysis: {str(e)}"
             }
         })
-        progress_queue.put("DONE")
 
 if __name__ == '__main__':
-    app.run(port=5000)
+    # Development server; run asgi:application under an ASGI server
+    # (e.g. uvicorn asgi:application) for non-blocking progress streams
+    app.run(port=5000, threaded=True)
@@ -0,0 +1,105 @@
+"""ASGI entry point: uvicorn asgi:application
+
+Progress streams are served by a coroutine per watcher, so hundreds of
+clients following a job do not each hold a worker thread. Every other
+request is handed to the Flask app.
+"""
+import asyncio
+import json
+import re
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app, format_event, scheduler
+from helper.progress import is_visible
+
+PROGRESS_PATH = re.compile(r'^/progress/([0-9a-f]+)$')
+
+# Seconds between checks for new job events, and between keep-alive comments
+PROGRESS_POLL_INTERVAL = 0.25
+KEEPALIVE_INTERVAL = 15
+
+flask_application = WsgiToAsgi(app)
+
+
+async def send_json(send, status, data):
+    body = json.dumps(data).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'access-control-allow-origin', b'*')
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def stream_progress(job, receive, send, verbosity='normal'):
+    """Send the job's events as server-sent events until the job is done"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'access-control-allow-origin', b'*')
+        ]
+    })
+    position = 0
+    idle = 0.0
+    while True:
+        # Read the state first: a finished job has already logged every event
+        done = job.done
+        events = job.events_since(position)
+        if events:
+            position += len(events)
+            idle = 0.0
+            body = ''.join(format_event(event) for event in events if is_visible(event, verbosity))
+            if body:
+                await send({'type': 'http.response.body', 'body': body.encode('utf-8'), 'more_body': True})
+        elif done:
+            break
+        elif idle >= KEEPALIVE_INTERVAL:
+            idle = 0.0
+            await send({'type': 'http.response.body', 'body': b': keep-alive\n\n', 'more_body': True})
+
+        # Waiting on receive() doubles as the poll delay and notices disconnects
+        try:
+            message = await asyncio.wait_for(receive(), PROGRESS_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            idle += PROGRESS_POLL_INTERVAL
+            continue
+        if message['type'] == 'http.disconnect':
+            return
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    match = PROGRESS_PATH.match(scope.get('path', ''))
+    if scope['type'] == 'http' and scope['method'] == 'GET' and match:
+        job = scheduler.get(match.group(1))
+        if job is None:
+            await send_json(send, 404, {'error': 'Unknown job'})
+        else:
+            query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            verbosity = query.get('verbosity', ['normal'])[0]
+            await stream_progress(job, receive, send, verbosity)
+        return
+
+    await flask_application(scope, receive, send)
@@ -0,0 +1,221 @@
+import json
+import random
+import re
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+# Identifier pieces for generated programs; names are combined so cohorts
+# have realistic vocabulary overlap without being identical
+NAME_PARTS = ('value', 'total', 'count', 'index', 'data', 'result', 'item', 'temp', 'sum', 'step',
+              'left', 'right', 'size', 'limit', 'score', 'node', 'key', 'rate', 'delta', 'acc')
+OPERATORS = ('+', '-', '*')
+
+PYTHON_KEYWORDS = {'def', 'return', 'for', 'in', 'range', 'if', 'else', 'while', 'print', 'and', 'or', 'not'}
+CPP_KEYWORDS = {'int', 'return', 'for', 'if', 'else', 'while', 'include', 'iostream', 'using', 'namespace',
+                'std', 'cout', 'endl', 'main'}
+
+LANGUAGE_SUFFIXES = {'py': '.py', 'cpp': '.cpp', 'ipynb': '.ipynb'}
+
+
+def identifier(rng: random.Random) -> str:
+    return f"{rng.choice(NAME_PARTS)}_{rng.choice(NAME_PARTS)}{rng.randint(0, 9)}"
+
+
+def expression(rng: random.Random, names: List[str]) -> str:
+    terms = [rng.choice(names) if rng.random() < 0.7 else str(rng.randint(1, 99))
+             for _ in range(rng.randint(2, 4))]
+    text = terms[0]
+    for term in terms[1:]:
+        text += f" {rng.choice(OPERATORS)} {term}"
+    return text
+
+
+def python_function(rng: random.Random) -> List[str]:
+    name = identifier(rng)
+    names = [identifier(rng) for _ in range(rng.randint(1, 3))]
+    lines = [f"def {name}({', '.join(names)}):"]
+    for _ in range(rng.randint(3, 8)):
+        kind = rng.random()
+        target = identifier(rng)
+        if kind < 0.5:
+            lines.append(f"    {target} = {expression(rng, names)}")
+        elif kind < 0.75:
+            loop = identifier(rng)
+            lines.append(f"    {target} = 0")
+            lines.append(f"    for {loop} in range({rng.randint(2, 50)}):")
+            lines.append(f"        {target} = {target} + {expression(rng, names + [loop])}")
+        else:
+            lines.append(f"    if {rng.choice(names)} > {rng.randint(0, 20)}:")
+            lines.append(f"        {target} = {expression(rng, names)}")
+            lines.append("    else:")
+            lines.append(f"        {target} = {expression(rng, names)}")
+        names.append(target)
+    lines.append(f"    return {expression(rng, names)}")
+    return lines
+
+
+def cpp_function(rng: random.Random) -> List[str]:
+    name = identifier(rng)
+    names = [identifier(rng) for _ in range(rng.randint(1, 3))]
+    lines = [f"int {name}({', '.join('int ' + arg for arg in names)}) {{"]
+    for _ in range(rng.randint(3, 8)):
+        kind = rng.random()
+        target = identifier(rng)
+        if kind < 0.5:
+            lines.append(f"    int {target} = {expression(rng, names)};")
+        elif kind < 0.75:
+            loop = identifier(rng)
+            lines.append(f"    int {target} = 0;")
+            lines.append(f"    for (int {loop} = 0; {loop} < {rng.randint(2, 50)}; {loop}++) {{")
+            lines.append(f"        {target} = {target} + {expression(rng, names + [loop])};")
+            lines.append("    }")
+        else:
+            lines.append(f"    int {target} = 0;")
+            lines.append(f"    if ({rng.choice(names)} > {rng.randint(0, 20)}) {{")
+            lines.append(f"        {target} = {expression(rng, names)};")
+            lines.append("    } else {")
+            lines.append(f"        {target} = {expression(rng, names)};")
+            lines.append("    }")
+        names.append(target)
+    lines.append(f"    return {expression(rng, names)};")
+    lines.append("}")
+    return lines
+
+
+def generate_program(rng: random.Random, language: str, functions: int) -> str:
+    """An independent solution: functions of random statements"""
+    if language == 'cpp':
+        lines = ["#include <iostream>", "using namespace std;", ""]
+        for _ in range(functions):
+            lines.extend(cpp_function(rng))
+            lines.append("")
+        lines.extend(["int main() {", "    cout << 0 << endl;", "    return 0;", "}"])
+    else:
+        lines = []
+        for _ in range(functions):
+            lines.extend(python_function(rng))
+            lines.append("")
+    return '\n'.join(lines) + '\n'
+
+
+def rename_identifiers(code: str, rng: random.Random, language: str) -> str:
+    """Consistently rename every generated identifier"""
+    keywords = CPP_KEYWORDS if language == 'cpp' else PYTHON_KEYWORDS
+    mapping: Dict[str, str] = {}
+
+    def rename(match):
+        name = match.group()
+        if name in keywords:
+            return name
+        if name not in mapping:
+            mapping[name] = f"{rng.choice(NAME_PARTS)}{rng.choice(NAME_PARTS).title()}{len(mapping)}"
+        return mapping[name]
+
+    return re.sub(r'\b[a-z]+_[a-z]+\d\b', rename, code)
+
+
+def reformat(code: str, rng: random.Random, language: str) -> str:
+    """Change indentation and spacing, add blank lines and comments"""
+    lines = []
+    for line in code.splitlines():
+        stripped = line.lstrip(' ')
+        depth = (len(line) - len(stripped)) // 4
+        if language != 'cpp':
+            line = '  ' * depth + stripped
+        else:
+            line = '\t' * depth + stripped
+        if rng.random() < 0.3:
+            line = re.sub(r' ([+\-*]) ', r'\1', line)
+        lines.append(line)
+        if stripped and rng.random() < 0.1:
+            lines.append('')
+        if stripped and rng.random() < 0.1:
+            lines.append(('# ' if language != 'cpp' else '// ') + 'checked')
+    return '\n'.join(lines) + '\n'
+
+
+def notebook(code: str, empty_cells: int = 5) -> str:
+    """Wrap Python code in a notebook, one function per code cell.
+
+    Trailing empty cells, as left behind in many real notebooks, must never
+    make two notebooks match.
+    """
+    cells = []
+    for chunk in re.split(r'\n(?=def )', code.strip()):
+        cells.append({
+            'cell_type': 'code',
+            'execution_count': len(cells) + 1,
+            'metadata': {},
+            'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': ['0\n']}],
+            'source': chunk.splitlines(keepends=True)
+        })
+    for _ in range(empty_cells):
+        cells.append({'cell_type': 'code', 'execution_count': None, 'metadata': {}, 'outputs': [], 'source': []})
+    return json.dumps({'cells': cells, 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5})
+
+
+def generate_cohort(folder: Path, submissions: int = 50, languages: Tuple[str, ...] = ('py', 'cpp', 'ipynb'),
+                    copy_rate: float = 0.2, rename_rate: float = 0.5, reformat_rate: float = 0.5,
+                    functions: int = 8, seed: int = 0) -> Dict:
+    """Write a synthetic cohort of submission zips into folder.
+
+    Every user gets one file per language. A copy_rate fraction of users copy
+    each file from an earlier user, renaming identifiers with probability
+    rename_rate and reformatting with probability reformat_rate. Returns the
+    zip paths and the ground truth: the sorted (user1, user2) pairs whose
+    code derives from the same original, directly or through other copies.
+    """
+    rng = random.Random(seed)
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    users = [f"student{index:05d}" for index in range(submissions)]
+    sources: Dict[str, Dict[str, str]] = {}
+    # User whose independent solution each user's code derives from
+    roots: Dict[str, str] = {}
+
+    for position, user in enumerate(users):
+        copies = position > 0 and rng.random() < copy_rate
+        origin = users[rng.randrange(position)] if copies else None
+        roots[user] = roots[origin] if origin else user
+        sources[user] = {}
+        # .py and .ipynb files of a user share one Python source
+        for base in sorted({'cpp' if language == 'cpp' else 'py' for language in languages}):
+            if origin:
+                code = sources[origin][base]
+                if rng.random() < rename_rate:
+                    code = rename_identifiers(code, rng, base)
+                if rng.random() < reformat_rate:
+                    code = reformat(code, rng, base)
+            else:
+                code = generate_program(rng, base, functions)
+            sources[user][base] = code
+
+    families: Dict[str, List[str]] = {}
+    for user in users:
+        families.setdefault(roots[user], []).append(user)
+    copied_pairs: Set[Tuple[str, str]] = {
+        (family[a], family[b])
+        for family in families.values()
+        for a in range(len(family))
+        for b in range(a + 1, len(family))
+    }
+
+    paths = []
+    total_bytes = 0
+    for user in users:
+        path = folder / f"{user}.zip"
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for language in languages:
+                code = sources[user]['cpp' if language == 'cpp' else 'py']
+                content = notebook(code) if language == 'ipynb' else code
+                total_bytes += len(content)
+                archive.writestr(f"{user}/solution{LANGUAGE_SUFFIXES[language]}", content)
+        paths.append(path)
+
+    return {
+        'paths': paths,
+        'copied_pairs': sorted(copied_pairs),
+        'files': len(users) * len(languages),
+        'bytes': total_bytes
+    }
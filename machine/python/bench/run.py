@@ -0,0 +1,200 @@
+"""Benchmark the checker pipeline on a synthetic cohort.
+
+    python -m bench.run --submissions 200 --engines lines winnowing ast
+    python -m bench.run --baseline bench/results/previous.json
+
+Results are written as JSON (bench/results/ by default) so runs before and
+after a change can be compared with --baseline.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+import checker
+from bench.cohort import generate_cohort
+from helper.extractor import iter_zip_contents
+
+RESULTS_FOLDER = Path(__file__).parent / 'results'
+
+
+def timed(function, *args, **kwargs):
+    """Run function, returning (result, seconds)"""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(function, *args, **kwargs):
+    """Peak Python heap allocation (bytes) while function runs in this process"""
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_stages(cohort):
+    """Time the pipeline stages that check_plagiarism_files is built from"""
+    contents, extract_seconds = timed(
+        lambda: [(path.stem, name, content) for path in cohort['paths'] for name, content in iter_zip_contents(path)]
+    )
+    normalized, normalize_seconds = timed(
+        lambda: [checker.normalize_code(content, checker.language_for(name)) for _, name, content in contents]
+    )
+    _, prepare_seconds = timed(checker.prepare_files, cohort['paths'])
+
+    # Raw-text matchers on the copied pairs, where they do real work
+    by_user = {}
+    for user, name, content in contents:
+        by_user.setdefault(user, {})[Path(name).name] = content
+    text_pairs = [
+        (by_user[user1][name], by_user[user2][name])
+        for user1, user2 in cohort['copied_pairs']
+        for name in by_user[user1]
+        if name in by_user[user2]
+    ]
+    _, exact_seconds = timed(lambda: [checker.find_exact_matches(code1, code2) for code1, code2 in text_pairs])
+    _, segment_seconds = timed(lambda: [checker.get_similar_segments(code1, code2) for code1, code2 in text_pairs])
+
+    lines = sum(text.count('\n') + 1 for text in normalized)
+    return {
+        'extract_seconds': extract_seconds,
+        'normalize_seconds': normalize_seconds,
+        'normalize_lines_per_second': lines / normalize_seconds if normalize_seconds else None,
+        'prepare_seconds': prepare_seconds,
+        'text_pairs': len(text_pairs),
+        'find_exact_matches_seconds': exact_seconds,
+        'get_similar_segments_seconds': segment_seconds
+    }
+
+
+def bench_engine(cohort, engine, args):
+    """End-to-end check with one engine: time, throughput, memory and recall"""
+    options = dict(
+        similarity_threshold=args.threshold,
+        # Keep every result so recall is not capped by the report size
+        batch_size=cohort['files'] ** 2,
+        engine=engine,
+        workers=args.workers,
+        candidate_strategy=args.strategy
+    )
+    report, seconds = timed(checker.check_plagiarism_files, cohort['paths'], **options)
+    summary = report['summary']
+
+    truth = set(map(tuple, cohort['copied_pairs']))
+    flagged = {tuple(sorted((result['user1'], result['user2']))) for result in report['results']}
+    found = len(truth & flagged)
+
+    numbers = {
+        'seconds': seconds,
+        'comparisons': summary['total_comparisons'],
+        'pruned_comparisons': summary['pruned_comparisons'],
+        'pairs_per_second': summary['total_comparisons'] / seconds if seconds else None,
+        'significant_matches': summary['significant_matches'],
+        'flagged_user_pairs': len(flagged),
+        'recall': found / len(truth) if truth else None,
+        'precision': found / len(flagged) if flagged else None
+    }
+    if not args.skip_memory:
+        # Separate run: tracing allocations slows everything down
+        numbers['peak_memory_bytes'] = peak_memory(checker.check_plagiarism_files, cohort['paths'], **options)
+    return numbers
+
+
+def compare_runs(baseline, current):
+    """Print how the current run moved against a saved one"""
+    print(f"Compared with {baseline['timestamp']}:")
+    for engine, numbers in current['engines'].items():
+        previous = baseline.get('engines', {}).get(engine)
+        if not previous:
+            continue
+        for key in ('seconds', 'pairs_per_second', 'peak_memory_bytes', 'recall', 'precision'):
+            old, new = previous.get(key), numbers.get(key)
+            if old and new is not None:
+                print(f"  {engine:10} {key:18} {old:>14.4g} -> {new:<14.4g} ({new / old - 1:+.1%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--submissions', type=int, default=100)
+    parser.add_argument('--languages', nargs='+', default=['py', 'cpp', 'ipynb'], choices=['py', 'cpp', 'ipynb'])
+    parser.add_argument('--functions', type=int, default=8, help='functions per generated file')
+    parser.add_argument('--copy-rate', type=float, default=0.2)
+    parser.add_argument('--rename-rate', type=float, default=0.5)
+    parser.add_argument('--reformat-rate', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--threshold', type=float, default=0.5)
+    parser.add_argument('--engines', nargs='+', default=list(checker.DETECTION_ENGINES),
+                        choices=checker.DETECTION_ENGINES)
+    parser.add_argument('--strategy', default='prefix', choices=checker.CANDIDATE_STRATEGIES)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--skip-memory', action='store_true', help='skip the traced peak-memory runs')
+    parser.add_argument('--output', type=Path, help='JSON file for the results')
+    parser.add_argument('--baseline', type=Path, help='earlier results JSON to compare with')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as folder:
+        cohort, generate_seconds = timed(
+            generate_cohort, Path(folder),
+            submissions=args.submissions,
+            languages=tuple(args.languages),
+            copy_rate=args.copy_rate,
+            rename_rate=args.rename_rate,
+            reformat_rate=args.reformat_rate,
+            functions=args.functions,
+            seed=args.seed
+        )
+        print(f"Cohort: {len(cohort['paths'])} submissions, {cohort['files']} files, "
+              f"{len(cohort['copied_pairs'])} copied pairs ({generate_seconds:.2f}s)")
+
+        stages = bench_stages(cohort)
+        engines = {}
+        for engine in args.engines:
+            engines[engine] = bench_engine(cohort, engine, args)
+            numbers = engines[engine]
+            print(f"{engine:10} {numbers['seconds']:8.3f}s  {numbers['comparisons']:8} pairs  "
+                  f"recall {numbers['recall'] or 0:.3f}  precision {numbers['precision'] or 0:.3f}")
+
+    run = {
+        'timestamp': datetime.now().isoformat(),
+        'config': {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'cohort': {
+            'submissions': len(cohort['paths']),
+            'files': cohort['files'],
+            'bytes': cohort['bytes'],
+            'copied_pairs': len(cohort['copied_pairs']),
+            'generate_seconds': generate_seconds
+        },
+        'stages': stages,
+        'engines': engines
+    }
+
+    output = args.output or RESULTS_FOLDER / f"bench-{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            compare_runs(json.load(f), run)
+    return run
+
+
+if __name__ == '__main__':
+    main()
@@ -1,49 +1,172 @@
 import os
 from pathlib import Path
 import re
-from difflib import SequenceMatcher, Differ
+import argparse
+import glob
+from difflib import SequenceMatcher
+from bisect import bisect_right
 import sys
+import time
 from pathlib import Path
 import ast
+import keyword
 import tokenize
 from io import StringIO
 
 # Add the parent directory to Python path
 sys.path.append(str(Path(__file__).parent))
 
-from helper.extractor import read_file_content, organize_submissions
+from helper.extractor import (
+    CODE_EXTENSIONS, decode_member, is_notebook, iter_zip_contents, notebook_cell_starts, read_zip_member
+)
+from helper.fingerprint import (
+    build_window_index, find_common_runs, match_fingerprints, match_window_hashes, minhash_permutations,
+    minhash_signature, select_aligned_runs, verify_window_matches, window_index_from_hashes,
+    winnow_fingerprints
+)
+from helper.candidates import (
+    jaccard_candidates, lsh_band_count, lsh_candidates, matrix_candidates, shared_key_candidates
+)
+from helper.cache import SubmissionCache, content_key
+from helper.checkpoint import BatchCheckpoint, run_fingerprint
+from helper.syntax import multiset_features, subtree_fingerprints
+from helper.boilerplate import build_boilerplate_index
+from helper.progress import VERBOSITY_LEVELS, ProgressReporter, event_category
+from helper.metrics import NULL_METRICS, CheckMetrics
+from helper.report import RESULT_FORMATS, FileTable, compact_report, compact_result
+from helper.vocabulary import TokenVocabulary, id_similarity, token_lookup
 import json
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache, partial
+from itertools import repeat
+import heapq
 
-def normalize_code(code):
-    """Normalize code for comparison by removing irrelevant differences"""
-    # Remove comments
-    code = re.sub(r'//.*?\n|/\*.*?\*/', '', code, flags=re.S)
-    
-    # Remove braces and non-essential symbols
-    code = re.sub(r'[{}();]', '', code)
-    
-    # Normalize whitespace
-    code = ' '.join(code.split())
-    
-    # Normalize string literals
-    code = re.sub(r'".*?"', '""', code)
-    code = re.sub(r'\'.*?\'', '\'\'', code)
-    
-    # Normalize numbers     
-    code = re.sub(r'\b\d+\b', 'N', code)
-    
-    # Remove preprocessor directives
-    code = re.sub(r'#.*?\n', '\n', code)
-    
-    return code.lower()
+# Original file texts kept in memory at once while rendering results
+CONTENT_CACHE_FILES = 64
+
+# Process pools are started from a fork server: forking the threaded web app
+# could copy locks held by other threads (stdout, sqlite) into the workers
+# (scripts calling with workers > 1 need an if __name__ == '__main__' guard)
+POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+# Seconds get_similar_segments may spend on a single pair
+SEGMENT_TIME_BUDGET = 1.0
+
+# Detection engines: 'lines' compares token sets and exact line windows,
+# 'winnowing' compares winnowed k-gram fingerprints of anonymized tokens,
+# 'ast' compares anonymized syntax subtree hashes of Python files (other
+# files fall back to tokens). The fingerprint engines use the Jaccard
+# similarity of the fingerprints and take match_details from the shared
+# ones, so renamed and reformatted copies are found without text scans.
+DETECTION_ENGINES = ('lines', 'winnowing', 'ast')
+
+# Candidate pair generation: 'prefix' keeps every pair whose Jaccard
+# similarity can exceed the threshold, 'matrix' computes it exactly with
+# sparse matrix products (NumPy/SciPy), 'minhash' keeps pairs whose MinHash
+# signatures collide in an LSH band, trading recall for speed
+CANDIDATE_STRATEGIES = ('prefix', 'matrix', 'minhash')
+
+# Precompiled scanners for the constructs that hide each other (strings,
+# comments, preprocessor lines). They are matched in one left-to-right pass
+# so a '#' or '//' inside a string literal is never taken for a comment.
+MASKED_PATTERNS = {
+    'python': re.compile(
+        r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\''
+        r'|"(?:\\.|[^"\\\r\n])*"|\'(?:\\.|[^\'\\\r\n])*\''
+        r'|#[^\r\n]*'
+    ),
+    'c': re.compile(
+        r'"(?:\\.|[^"\\\r\n])*"|\'(?:\\.|[^\'\\\r\n])*\''
+        r'|//[^\r\n]*|/\*[\s\S]*?\*/'
+        r'|^[ \t]*#[^\r\n]*',
+        re.M
+    )
+}
+NUMBER_PATTERN = re.compile(r'(?<!\w)\d[\w.]*')
+NUMBER_PLACEHOLDER = 'n'
+DROPPED_SYMBOLS = str.maketrans('{}();', '     ')
+
+# Winnowing tokens: words and single symbols of normalized code. Words that
+# are not keywords become IDENTIFIER_PLACEHOLDER, as in MOSS, so renamed
+# copies keep their fingerprints
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+IDENTIFIER_PLACEHOLDER = 'v'
+# Number literals stay a token of their own: a digit never starts an identifier
+NUMBER_TOKEN = '0'
+KEYWORDS = {
+    'python': frozenset(word.lower() for word in keyword.kwlist),
+    'c': frozenset((
+        'auto', 'bool', 'break', 'case', 'catch', 'char', 'class', 'const', 'continue', 'default',
+        'delete', 'do', 'double', 'else', 'enum', 'extends', 'false', 'final', 'float', 'for', 'if',
+        'implements', 'import', 'int', 'long', 'namespace', 'new', 'null', 'nullptr', 'private',
+        'protected', 'public', 'return', 'short', 'signed', 'sizeof', 'static', 'struct', 'switch',
+        'template', 'this', 'throw', 'true', 'try', 'typedef', 'unsigned', 'using', 'void', 'while'
+    ))
+}
+
+LANGUAGE_EXTENSIONS = {
+    '.py': 'python',
+    '.ipynb': 'python',
+    '.cpp': 'c',
+    '.c': 'c',
+    '.h': 'c',
+    '.hpp': 'c',
+    '.java': 'c'
+}
+
+def language_for(filename):
+    """Lexer family for a file name, defaulting to C-like syntax"""
+    return LANGUAGE_EXTENSIONS.get(Path(filename).suffix.lower(), 'c')
+
+def replace_masked(match):
+    """String literals become "", comments disappear; line breaks are kept"""
+    text = match.group()
+    # Any line boundary str.splitlines() knows, not just '\n'
+    newlines = '\n' * (len((text + '.').splitlines()) - 1)
+    if text[0] in '"\'':
+        return ' "" ' + newlines
+    return newlines
+
+def normalize_code(code, language='c', number_placeholder=NUMBER_PLACEHOLDER):
+    """Normalize code for comparison by removing irrelevant differences
+
+    Comments and preprocessor lines are dropped, string literals become "",
+    numbers become number_placeholder, {}(); are removed and whitespace is
+    collapsed. Each line of code.splitlines() yields exactly one normalized
+    line, joined with '\n', so positions map back to the rendered original.
+    """
+    masked = MASKED_PATTERNS.get(language, MASKED_PATTERNS['c'])
+    code = masked.sub(replace_masked, code.lower())
+    code = NUMBER_PATTERN.sub(number_placeholder, code).translate(DROPPED_SYMBOLS)
+    return '\n'.join([' '.join(line.split()) for line in code.splitlines()])
+
+def anonymize_tokens(normalized, language='c'):
+    """Lines of normalized code as winnowing tokens, identifiers replaced
+
+    Numbers should be normalized to NUMBER_TOKEN, so they are not anonymized
+    like identifiers.
+    """
+    keywords = KEYWORDS.get(language, KEYWORDS['c'])
+    return [
+        ' '.join(
+            token if token in keywords or not (token[0].isalpha() or token[0] == '_') else IDENTIFIER_PLACEHOLDER
+            for token in TOKEN_PATTERN.findall(line)
+        )
+        for line in normalized.split('\n')
+    ]
 
 def get_similarity(text1, text2):
     """Calculate similarity with improved accuracy"""
     # Use token-based similarity
-    tokens1 = set(text1.split())
-    tokens2 = set(text2.split())
-    
+    return get_token_similarity(set(text1.split()), set(text2.split()))
+
+def get_token_similarity(tokens1, tokens2):
+    """Jaccard similarity of two token sets"""
     if not tokens1 or not tokens2:
         return 0.0  # Return 0 similarity if either text is empty
     
@@ -52,106 +175,44 @@ def get_similarity(text1, text2):
     
     return len(intersection) / len(union)
 
-def get_similar_segments(code1, code2):
-    """Find similar code segments between two files"""
-    differ = Differ()
-    lines1 = code1.splitlines()
-    lines2 = code2.splitlines()
-    
-    # Get diff and find matching segments
-    diff = list(differ.compare(lines1, lines2))
-    similar_segments = []
-    current_segment = []
-    
-    for line in diff:
-        if line.startswith('  '): # Matching lines
-            current_segment.append(line[2:])
-        elif current_segment:
-            if len(current_segment) >= 3:  # Only include segments with 3+ lines
-                similar_segments.append('\n'.join(current_segment))
-            current_segment = []
-            
-    if current_segment and len(current_segment) >= 3:
-        similar_segments.append('\n'.join(current_segment))
-        
-    return similar_segments
+def get_similar_segments(code1, code2, min_lines=3, time_budget=SEGMENT_TIME_BUDGET):
+    """Find similar code segments between two files
 
-def find_exact_matches(code1, code2, min_lines=5):
-    """Find exact matching code segments with improved accuracy"""
-    if not code1.strip() or not code2.strip():
-        return []  # Return empty list if either code is empty
-    
+    Returns the text of every aligned run of at least min_lines identical
+    lines, in file order. Runs are anchored on hashed line windows, so the
+    cost stays near-linear in file length; after time_budget seconds the
+    segments found so far are returned.
+    """
     lines1 = code1.splitlines()
     lines2 = code2.splitlines()
-    matches = []
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
     
-    # Use sliding window for comparison
-    for i in range(len(lines1) - min_lines + 1):
-        window1 = lines1[i:i + min_lines]
-        window1_str = '\n'.join(window1)
-        
-        for j in range(len(lines2) - min_lines + 1):
-            window2 = lines2[j:j + min_lines]
-            window2_str = '\n'.join(window2)
-            
-            if window1_str == window2_str:
-                if window1_str.strip():  # Ensure segment is not empty
-                    matches.append({
-                        'segment': window1_str,
-                        'segment2': window2_str,
-                        'line_count': min_lines,
-                        'line_number1': i + 1,
-                        'line_number2': j + 1
-                    })
-    
-    return matches
-
-def check_plagiarism():
-    base_path = Path('../data/answer')
-    result_path = Path('../result/result.json')
-    all_files = []
-    
-    # Collect all .cpp and .zip files
-    for folder in base_path.iterdir():
-        if folder.is_dir():
-            for file in folder.glob('*.*'):
-                if file.suffix.lower() in ['.cpp', '.zip']:
-                    all_files.append(file)
-    
-    # Compare each file with every other file
-    results = []
-    for i, file1 in enumerate(all_files):
-        code1 = normalize_code(read_file_content(file1))
-            
-        for file2 in all_files[i+1:]:
-            code2 = normalize_code(read_file_content(file2))
-            
-            similarity = get_similarity(code1, code2)
-            if similarity > 0.7:  # Threshold for suspicious similarity
-                similar_segments = get_similar_segments(code1, code2)
-                results.append({
-                    'file1': str(file1.relative_to(base_path)),
-                    'file2': str(file2.relative_to(base_path)),
-                    'similarity': float(f"{similarity:.4f}"),
-                    'similar_segments': similar_segments
-                })
-    
-    # Create result object
-    result_data = {
-        "timestamp": datetime.now().isoformat(),
-        "results": results
-    }
-    
-    # Save to JSON file
-    result_path.parent.mkdir(exist_ok=True)
-    with open(result_path, 'w', encoding='utf-8') as f:
-        json.dump(result_data, f, indent=4)
+    runs = find_common_runs(lines1, lines2, min_lines, deadline)
+    return [
+        '\n'.join(lines1[i:i + length])
+        for i, _, length in select_aligned_runs(runs)
+    ]
+
+def find_exact_matches(code1, code2, min_lines=5, index1=None, index2=None):
+    """Find exact matching code segments with improved accuracy
+
+    Pre-built window indexes (see build_window_index) can be passed in so
+    callers comparing one file against many only hash it once.
+    """
+    if index1 is None:
+        if not code1.strip():
+            return []  # Return empty list if either code is empty
+        index1 = build_window_index(code1, min_lines)
+    if index2 is None:
+        if not code2.strip():
+            return []
+        index2 = build_window_index(code2, min_lines)
     
-    # Print results
-    if results:
-        print(f"\nPotential plagiarism detected. Results saved to {result_path}")
-    else:
-        print("\nNo suspicious similarities found.")
+    # Hash lookup of every window of file 1 in the index of file 2
+    return verify_window_matches(
+        code1.splitlines(), code2.splitlines(),
+        match_window_hashes(index1, index2), min_lines
+    )
 
 def merge_overlapping_matches(matches):
     """Merge overlapping plagiarism matches, keeping the largest segments."""
@@ -180,225 +241,819 @@ def merge_overlapping_matches(matches):
     merged.append(current)
     return merged
 
-def check_plagiarism_files(file_paths, progress_queue=None, similarity_threshold=0.7, batch_size=1000, callback=None):
-    """Check plagiarism between all files across all submissions without redundant comparisons"""
-    results = []
-    checked_lines = {}  # Dictionary to track checked lines per file pair
+def prepare_file(user, filename, content, source=None, engine='lines', metrics=None):
+    """Normalize and fingerprint one extracted file.
+
+    Only fingerprints are kept; the text is read back with load_file_content
+    when a match is rendered. The compared tokens depend on the engine (see
+    DETECTION_ENGINES). Notebooks also record where each cell starts.
+    """
+    metrics = metrics or NULL_METRICS
+    language = language_for(filename)
+    with metrics.stage('normalize'):
+        number_placeholder = NUMBER_TOKEN if engine == 'winnowing' else NUMBER_PLACEHOLDER
+        normalized = normalize_code(content, language, number_placeholder)
+    with metrics.stage('fingerprint'):
+        file = {
+            'user': user,
+            'filename': filename,
+            'source': source,
+            'is_empty': not content.strip(),
+            'windows': build_window_index(content)
+        }
+        if is_notebook(filename):
+            file['cells'] = notebook_cell_starts(content)
+        structure = None
+        if engine == 'ast' and language == 'python':
+            structure = subtree_fingerprints(content, file.get('cells'))
+        if engine == 'winnowing':
+            file['fingerprints'] = winnow_fingerprints(anonymize_tokens(normalized, language))
+            file['tokens'] = set(file['fingerprints']['hashes'])
+        elif structure is not None:
+            file['fingerprints'] = structure['statements']
+            file['tokens'] = multiset_features(structure['hashes'])
+        else:
+            file['tokens'] = set(normalized.split())
+    return file
+
+def prepare_submission(path, cache=None, engine='lines', metrics=None, user=None):
+    """Extract and prepare every code file of one submission zip.
 
+    Files are streamed out of the zip one at a time (extract -> normalize ->
+    fingerprint). With a cache, the zip is keyed by its content hash so a
+    re-run against an unchanged submission skips extraction and
+    normalization entirely. The user defaults to the zip's stem.
+    """
+    metrics = metrics or NULL_METRICS
+    user = user or path.stem
+    key = None
+    if cache is not None:
+        try:
+            key = content_key(path.read_bytes())
+        except OSError:
+            key = None
+        if key and engine != 'lines':
+            key = f"{key}:{engine}"
+        with metrics.stage('cache'):
+            cached = cache.get(key) if key else None
+        if cached is not None:
+            metrics.count('cache_hits')
+            files = []
+            for entry in cached:
+                file = {
+                    'user': user,
+                    'filename': entry['filename'],
+                    'source': path,
+                    'is_empty': entry['is_empty'],
+                    'tokens': set(entry['tokens']),
+                    'windows': window_index_from_hashes(entry['window_hashes'])
+                }
+                for optional in ('fingerprints', 'cells'):
+                    if optional in entry:
+                        file[optional] = entry[optional]
+                files.append(file)
+            return files
+        metrics.count('cache_misses')
+
+    files = [
+        prepare_file(user, filename, content, source=path, engine=engine, metrics=metrics)
+        for filename, content in iter_zip_contents(path, metrics=metrics)
+    ]
+    if key:
+        entries = []
+        for file in files:
+            entry = {
+                'filename': file['filename'],
+                'is_empty': file['is_empty'],
+                'tokens': sorted(file['tokens']),
+                'window_hashes': file['windows']['hashes']
+            }
+            for optional in ('fingerprints', 'cells'):
+                if optional in file:
+                    entry[optional] = file[optional]
+            entries.append(entry)
+        with metrics.stage('cache'):
+            cache.put(key, entries)
+    return files
+
+def load_file_content(file):
+    """Read the original text of a prepared file back from its submission zip"""
+    if file.get('source') is None:
+        return ""
+    return read_zip_member(file['source'], file['filename'])
+
+def prepare_submission_task(path, cache, engine, user):
+    """Process pool task: prepare one submission, returning (files, metrics)"""
+    metrics = CheckMetrics()
+    files = prepare_submission(path, cache, engine, metrics, user)
+    return files, metrics.as_dict()
+
+def prepare_files(file_paths, cache=None, baseline_paths=(), engine='lines', metrics=None, workers=1,
+                  user_names=None):
+    """Prepare all submission zips, returning (users, flat list of files).
+
+    Users are named by user_names (zip path -> name) or else the zip's stem.
+    Files from baseline_paths are marked with is_new=False; a user present in
+    both lists keeps only the new submission. With workers > 1, zips are
+    extracted and normalized in a process pool (uploads held in memory are
+    pickled with their content, see helper.extractor.SpooledSubmission).
+    """
+    metrics = metrics or NULL_METRICS
+    user_names = user_names or {}
+    zips = [
+        (path, user_names.get(path, path.stem), is_new)
+        for paths, is_new in ((baseline_paths, False), (file_paths, True))
+        for path in paths
+        if path.suffix.lower() == '.zip'
+    ]
+    
+    submissions = {}
+    
+    def add_submission(user, is_new, files):
+        for file in files:
+            file['is_new'] = is_new
+        submissions.pop(user, None)
+        submissions[user] = files
+    
+    if workers > 1 and len(zips) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT) as executor:
+            prepared = executor.map(
+                prepare_submission_task,
+                [path for path, _, _ in zips], repeat(cache), repeat(engine), [user for _, user, _ in zips],
+                chunksize=max(1, len(zips) // (workers * 4))
+            )
+            for (_, user, is_new), (files, worker_metrics) in zip(zips, prepared):
+                metrics.merge(worker_metrics)
+                add_submission(user, is_new, files)
+    else:
+        for path, user, is_new in zips:
+            add_submission(user, is_new, prepare_submission(path, cache, engine, metrics, user))
+    
+    all_files = [file for files in submissions.values() for file in files]
+    return list(submissions.keys()), all_files
+
+def prepare_templates(template_paths, cache=None, engine='lines', metrics=None):
+    """Prepare lecturer template files (zips or single code files) like submissions"""
+    template_files = []
+    for path in template_paths:
+        if path.suffix.lower() == '.zip':
+            template_files.extend(prepare_submission(path, cache, engine, metrics))
+        elif path.suffix.lower() in CODE_EXTENSIONS:
+            # Uploaded templates (helper.extractor.SpooledSubmission) carry their file name
+            name = Path(getattr(path, 'filename', None) or path.name).name
+            try:
+                content = decode_member(path.read_bytes(), name)
+            except (OSError, ValueError) as e:
+                print(f"Skipping template {name}: {e}")
+                continue
+            template_files.append(prepare_file('template', name, content, engine=engine, metrics=metrics))
+    return template_files
+
+def count_cross_user_pairs(owners):
+    """Number of file pairs whose files belong to different users"""
+    file_counts = Counter(owners)
+    return (len(owners) * (len(owners) - 1)) // 2 - sum(
+        count * (count - 1) // 2 for count in file_counts.values()
+    )
+
+def result_sort_key(result):
+    """Sort key for results: exact matches first, then by similarity"""
+    return (-int(result.get('is_exact_match', False)),
+            -result['similarity'],
+            len(result.get('similar_segments', [])))
+
+def worst_first_key(result, i, j):
+    """Heap key putting the lowest ranked result (see result_sort_key) first
+
+    Ties are ranked by pair order, so the kept results never depend on the
+    order in which pairs finish.
+    """
+    return tuple(-value for value in result_sort_key(result)) + (-i, -j)
+
+def find_candidate_pairs(all_files, similarity_threshold, check_exact, strategy='prefix',
+                         num_permutations=128, lsh_bands=None):
+    """Return the sorted (i, j) pairs of all_files worth comparing (see CANDIDATE_STRATEGIES)
+
+    Pairs sharing a line window are always kept when exact checks run. For
+    'minhash', more permutations raise accuracy and more bands raise recall
+    at the cost of precision.
+    """
+    owners = [file['user'] for file in all_files]
+    token_sets = [file['token_ids'] for file in all_files]
+
+    if strategy == 'prefix':
+        candidate_pairs = jaccard_candidates(token_sets, similarity_threshold, groups=owners)
+    elif strategy == 'matrix':
+        candidate_pairs = matrix_candidates(token_sets, similarity_threshold, groups=owners)
+    elif strategy == 'minhash':
+        permutations = minhash_permutations(num_permutations)
+        signatures = [minhash_signature(tokens, permutations) for tokens in token_sets]
+        bands = lsh_bands or lsh_band_count(num_permutations, similarity_threshold)
+        candidate_pairs = lsh_candidates(signatures, bands, groups=owners)
+    else:
+        raise ValueError(f"Unknown candidate strategy: {strategy}")
+
+    if check_exact:
+        candidate_pairs |= shared_key_candidates(
+            [file['windows']['positions'] for file in all_files],
+            groups=owners
+        )
+    return sorted(candidate_pairs)
+
+def intern_file_tokens(all_files):
+    """Replace each file's token set by sorted ids from a shared vocabulary.
+
+    Files also get a lookup of their ids (see token_lookup), so no pair has
+    to build a set to compute Jaccard.
+    """
+    vocabulary = TokenVocabulary()
+    for file in all_files:
+        file['token_ids'] = vocabulary.intern(file.pop('tokens'))
+    
+    for file in all_files:
+        file['token_lookup'] = token_lookup(file['token_ids'], len(vocabulary))
+    return vocabulary
+
+def file_similarity(file1, file2):
+    """Jaccard similarity of two prepared files (see intern_file_tokens)"""
+    return id_similarity(file1['token_ids'], file2['token_ids'], file1['token_lookup'], file2['token_lookup'])
+
+def compare_file_pair(file1, file2, similarity_threshold, check_exact):
+    """Compare two prepared files using their fingerprints only.
+
+    Returns (outcome, analysis event). A non-None outcome still has to be
+    confirmed and rendered against the original text with render_result;
+    its event is produced there. Files prepared by the winnowing or ast
+    engine also get the line ranges of their shared fingerprints.
+    """
+    # Skip comparison if either file is empty
+    if file1['is_empty'] or file2['is_empty']:
+        return None, {
+            "type": "info",
+            "message": "Skipping comparison due to empty file.",
+            "files": [file1['filename'], file2['filename']]
+        }
+
+    # For thresholds above 0.4, perform exact match checks
+    if check_exact:
+        positions = match_window_hashes(file1['windows'], file2['windows'])
+        if positions:
+            return {'exact_positions': positions}, None
+
+    # Similarity check
+    similarity = file_similarity(file1, file2)
+    
+    if similarity <= similarity_threshold:
+        return None, low_similarity_event(file1, file2, similarity)
+    if 'fingerprints' in file1 and 'fingerprints' in file2:
+        return {
+            'similarity': similarity,
+            'fingerprint_ranges': match_fingerprints(file1['fingerprints'], file2['fingerprints'])
+        }, None
+    return {'similarity': similarity}, None
+
+def low_similarity_event(file1, file2, similarity):
+    return {
+        "type": "info",
+        "message": f"Low similarity: {similarity:.1%}",
+        "files": [file1['filename'], file2['filename']],
+        "reason": "Below threshold"
+    }
+
+def render_result(file1, file2, outcome, content1, content2, similarity_threshold, metrics=None):
+    """Build the reported result for a compared pair from the original text.
+
+    Returns (result or None, analysis event). The original code itself is
+    only attached to the results that make it into the report.
+    """
+    metrics = metrics or NULL_METRICS
+    if 'exact_positions' in outcome:
+        with metrics.stage('exact_matching'):
+            exact_matches = verify_window_matches(
+                content1.splitlines(), content2.splitlines(),
+                outcome['exact_positions'], file1['windows']['min_lines']
+            )
+        
+        if exact_matches:
+            exact_matches = add_cell_numbers(merge_overlapping_matches(exact_matches), file1, file2)
+            return {
+                'file1': f"{file1['filename']}",
+                'file2': f"{file2['filename']}",
+                'user1': file1['user'],
+                'user2': file2['user'],
+                'similarity': 1.0,
+                'similar_segments': [match['segment'] for match in exact_matches],
+                'match_details': exact_matches,
+                'is_exact_match': True
+            }, {
+                "type": "warning",
+                "message": "Exact match found!",
+                "files": [file1['filename'], file2['filename']],
+                "matches": len(exact_matches),
+                "details": [
+                    f"Lines {m['line_number1']}-{m['line_number1'] + m['line_count'] - 1}"
+                    for m in exact_matches
+                ]
+            }
+
+        # Every window hit was a hash collision: fall back to the similarity check
+        similarity = file_similarity(file1, file2)
+        if similarity <= similarity_threshold:
+            return None, low_similarity_event(file1, file2, similarity)
+    else:
+        similarity = outcome['similarity']
+
+    match_details = None
+    with metrics.stage('segments'):
+        if 'fingerprint_ranges' in outcome:
+            # Shared fingerprints already locate the copied code
+            match_details = add_cell_numbers(fingerprint_match_details(
+                content1.splitlines(), content2.splitlines(), outcome['fingerprint_ranges']
+            ), file1, file2)
+            similar_segments = [match['segment'] for match in match_details]
+        elif similarity > 0.3:
+            # For thresholds above 0.3, get similar segments
+            similar_segments = get_similar_segments(content1, content2)
+        else:
+            similar_segments = []  # Skip detailed analysis for very low similarities
+    
+    result = {
+        'file1': f"{file1['filename']}",
+        'file2': f"{file2['filename']}",
+        'user1': file1['user'],
+        'user2': file2['user'],
+        'similarity': float(f"{similarity:.4f}"),
+        'similar_segments': similar_segments,
+        'is_exact_match': False
+    }
+    if match_details is not None:
+        result['match_details'] = match_details
+    return result, {
+        "type": "detection",
+        "message": f"Similarity detected: {similarity:.1%}",
+        "files": [file1['filename'], file2['filename']],
+        "similarity": similarity,
+        "segmentCount": len(similar_segments),
+        "reason": (
+            "High similarity in code structure" if similarity > 0.8
+            else "Moderate code similarity detected"
+        )
+    }
+
+def fingerprint_match_details(lines1, lines2, ranges):
+    """Match details for the (first1, last1, first2, last2) line ranges of match_fingerprints"""
+    return [
+        {
+            'segment': '\n'.join(lines1[first1:last1 + 1]),
+            'segment2': '\n'.join(lines2[first2:last2 + 1]),
+            'line_count': last1 - first1 + 1,
+            'line_number1': first1 + 1,
+            'line_number2': first2 + 1
+        }
+        for first1, last1, first2, last2 in ranges
+    ]
+
+def add_cell_numbers(match_details, file1, file2):
+    """Add the notebook cell of each match (cell1/cell2) for notebook files"""
+    for key, line_key, file in (('cell1', 'line_number1', file1), ('cell2', 'line_number2', file2)):
+        if file.get('cells'):
+            for match in match_details:
+                match[key] = bisect_right(file['cells'], match[line_key] - 1)
+    return match_details
+
+# Prepared files shipped once to each worker process by init_comparison_worker
+worker_files = None
+
+def init_comparison_worker(all_files):
+    """Process pool initializer: keep the prepared files for every block"""
+    global worker_files
+    worker_files = all_files
+    worker_file_content.cache_clear()
+
+@lru_cache(maxsize=CONTENT_CACHE_FILES)
+def worker_file_content(index):
+    """Original text of a worker file, read back from its source like file_content"""
+    return load_file_content(worker_files[index])
+
+def compare_pair_block(pairs, similarity_threshold, check_exact, keep_info=False):
+    """Compare a block of (i, j) pairs inside a worker process
+
+    Pairs with an outcome are rendered here as well (see render_result), so
+    reading sources back and extracting segments runs in parallel too.
+    Returns (rendered pairs as (i, j, result, event, seconds), info event
+    counts, stage metrics). Pairs without an outcome are only counted,
+    unless keep_info asks for their info events as well.
+    """
+    compared = []
+    counts = Counter()
+    metrics = CheckMetrics()
+    for i, j in pairs:
+        start = time.perf_counter()
+        with metrics.stage('compare'):
+            outcome, event = compare_file_pair(worker_files[i], worker_files[j], similarity_threshold, check_exact)
+        if outcome is not None:
+            with metrics.stage('read_back'):
+                content1, content2 = worker_file_content(i), worker_file_content(j)
+            result, event = render_result(
+                worker_files[i], worker_files[j], outcome, content1, content2, similarity_threshold, metrics
+            )
+            compared.append((i, j, result, event, time.perf_counter() - start))
+        elif keep_info:
+            compared.append((i, j, None, event, time.perf_counter() - start))
+        elif event:
+            counts[event_category(event)] += 1
+    return compared, counts, metrics.as_dict()
+
+def row_key(file):
+    """Identity of a file's comparison row that stays stable across runs"""
+    return (file['user'], file['filename'])
+
+def split_pair_blocks(candidate_pairs, block_count):
+    """Partition sorted (i, j) pairs into row blocks of roughly equal size"""
+    target = max(1, -(-len(candidate_pairs) // max(1, block_count)))
+    blocks = []
+    current = []
+    for index, pair in enumerate(candidate_pairs):
+        current.append(pair)
+        # Only cut between rows so each block covers whole rows of the triangle
+        next_row = candidate_pairs[index + 1][0] if index + 1 < len(candidate_pairs) else None
+        if len(current) >= target and next_row != pair[0]:
+            blocks.append(current)
+            current = []
+    if current:
+        blocks.append(current)
+    return blocks
+
+def check_plagiarism_files(file_paths, progress_queue=None, similarity_threshold=0.7, batch_size=1000, callback=None,
+                           candidate_strategy='prefix', num_permutations=128, lsh_bands=None, workers=1,
+                           cache=None, baseline_paths=None, engine='lines', template_paths=None,
+                           boilerplate_threshold=None, result_callback=None, progress_interval=1.0,
+                           verbosity='normal', result_format='full', match_callback=None,
+                           completed_rows=None, row_callback=None, user_names=None):
+    """Check plagiarism between all files across all submissions without redundant comparisons
+
+    similarity_threshold: Jaccard similarity above which a pair is reported.
+    engine: one of DETECTION_ENGINES.
+    candidate_strategy, num_permutations, lsh_bands: candidate pair
+        generation (CANDIDATE_STRATEGIES; MinHash permutations and LSH bands).
+    workers: process count for preparing and comparing; the report does not
+        depend on it.
+    cache: a helper.cache.SubmissionCache, so unchanged zips are not prepared
+        again.
+    baseline_paths: zips already compared with each other; only pairs with a
+        file from file_paths are checked.
+    template_paths, boilerplate_threshold: code subtracted before comparing
+        (starter code, and code shared by more than that fraction of users).
+    batch_size: number of best results kept (a bounded heap); only they get
+        original code. result_callback gets each result, without code, when
+        it enters them, and it may still be pushed out later.
+    result_format: 'full' embeds both files' code in every result, 'compact'
+        stores it once in report['files'] (helper.report).
+    progress_queue, callback, progress_interval, verbosity: coalesced progress
+        (helper.progress.ProgressReporter): snapshots every progress_interval
+        seconds; callback gets detections, and info events when 'verbose'.
+    match_callback: gets every significant result, without code.
+    completed_rows, row_callback: pairs (i, j > i) are compared in rows of
+        file i, keyed (user, filename). row_callback(rows, pairs) is called once
+        rows are compared and their matches delivered; rows in completed_rows
+        are skipped, so an interrupted run can resume.
+    user_names: zip path -> user name, where zip stems are not unique.
+
+    summary['metrics'] holds per-stage times (extract, normalize, fingerprint,
+    cache, boilerplate, intern, candidates, compare, exact_matching, segments,
+    read_back, total), counters and the slowest pairs.
+    """
+    if engine not in DETECTION_ENGINES:
+        raise ValueError(f"Unknown detection engine: {engine}")
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {result_format}")
+    if verbosity not in VERBOSITY_LEVELS:
+        raise ValueError(f"Unknown verbosity: {verbosity}")
+    metrics = CheckMetrics()
+    started = time.perf_counter()
     if progress_queue:
         progress_queue.put({"status": "processing", "stage": "Organizing submissions", "progress": 0})
     
     # Organize submissions
-    submissions = organize_submissions(file_paths)
-    users = list(submissions.keys())
-    
-    # Create a flat list of all files with their metadata
-    all_files = []
-    for user, files in submissions.items():
-        for filename, content in files:
-            normalized_content = normalize_code(content)
-            all_files.append({
-                'user': user,
-                'filename': filename,
-                'content': content,
-                'normalized': normalized_content
-            })
+    users, all_files = prepare_files(file_paths, cache=cache, baseline_paths=baseline_paths or (),
+                                     engine=engine, metrics=metrics, workers=workers,
+                                     user_names=user_names)
     
-    total_comparisons = (len(all_files) * (len(all_files) - 1)) // 2
-    comparisons_done = 0
+    # Remove template code shared by everyone before comparing anything
+    template_files = prepare_templates(template_paths or (), cache, engine, metrics)
+    with metrics.stage('boilerplate'):
+        boilerplate = build_boilerplate_index(all_files, template_files, boilerplate_threshold)
+        for file in all_files:
+            boilerplate.subtract(file)
+    with metrics.stage('intern'):
+        intern_file_tokens(all_files)
     
-    # Compare each file with every other file without redundancy
-    for i, file1 in enumerate(all_files):
-        for j in range(i + 1, len(all_files)):
-            file2 = all_files[j]
-            file_pair = (file1['filename'], file2['filename'])
-            
-            # Initialize checked lines for this file pair if not already done
-            if file_pair not in checked_lines:
-                checked_lines[file_pair] = set()
-            
-            # Skip comparison if files are from the same user
-            if file1['user'] == file2['user']:
-                if callback:
-                    callback({
-                        "type": "skip",
-                        "message": f"Skipping comparison of files from same user: {file1['user']}",
-                        "files": [file1['filename'], file2['filename']]
-                    })
-                continue
-            
-            # Skip comparison if either file is empty
-            if not file1['content'].strip() or not file2['content'].strip():
-                if callback:
-                    callback({
-                        "type": "info",
-                        "message": "Skipping comparison due to empty file.",
-                        "files": [file1['filename'], file2['filename']]
-                    })
-                comparisons_done += 1
-                continue
-                
-            comparisons_done += 1
-            
-            # For thresholds above 0.4, perform exact match checks
-            if similarity_threshold > 0.4:
-                exact_matches = find_exact_matches(file1['content'], file2['content'])
-                
-                # Filter out matches that have already been checked
-                exact_matches = [
-                    match for match in exact_matches
-                    if (match['line_number1'], match['line_number2']) not in checked_lines[file_pair]
-                ]
-                
-                if exact_matches:
-                    exact_matches = merge_overlapping_matches(exact_matches)
-                    
-                    # Mark these lines as checked
-                    for match in exact_matches:
-                        checked_lines[file_pair].add((match['line_number1'], match['line_number2']))
-                    
-                    if callback:
-                        callback({
-                            "type": "warning",
-                            "message": "Exact match found!",
-                            "files": [file1['filename'], file2['filename']],
-                            "matches": len(exact_matches),
-                            "details": [
-                                f"Lines {m['line_number1']}-{m['line_number1'] + m['line_count'] - 1}"
-                                for m in exact_matches
-                            ]
-                        })
-                    results.append({
-                        'file1': f"{file1['filename']}",
-                        'file2': f"{file2['filename']}",
-                        'user1': file1['user'],
-                        'user2': file2['user'],
-                        'similarity': 1.0,
-                        'similar_segments': [match['segment'] for match in exact_matches],
-                        'match_details': exact_matches,
-                        'originalCode1': file1['content'],
-                        'originalCode2': file2['content'],
-                        'is_exact_match': True
-                    })
-                    continue
-
-            # Similarity check
-            similarity = get_similarity(file1['normalized'], file2['normalized'])
-            
-            if similarity > similarity_threshold:
-                # For thresholds above 0.3, get similar segments
-                if similarity > 0.3:
-                    similar_segments = get_similar_segments(file1['content'], file2['content'])
-                    
-                    # Mark these segments as checked
-                    for segment in similar_segments:
-                        lines1 = segment.split('\n')
-                        for idx, line in enumerate(lines1, start=1):
-                            checked_lines[file_pair].add((idx, idx))
-                else:
-                    similar_segments = []  # Skip detailed analysis for very low similarities
-                
-                if callback:
-                    callback({
-                        "type": "detection",
-                        "message": f"Similarity detected: {similarity:.1%}",
-                        "files": [file1['filename'], file2['filename']],
-                        "similarity": similarity,
-                        "segmentCount": len(similar_segments),
-                        "reason": (
-                            "High similarity in code structure" if similarity > 0.8
-                            else "Moderate code similarity detected"
-                        )
-                    })
-                results.append({
-                    'file1': f"{file1['filename']}",
-                    'file2': f"{file2['filename']}",
-                    'user1': file1['user'],
-                    'user2': file2['user'],
-                    'similarity': float(f"{similarity:.4f}"),
-                    'similar_segments': similar_segments,
-                    'originalCode1': file1['content'],
-                    'originalCode2': file2['content'],
-                    'is_exact_match': False
-                })
-            else:
-                if callback:
-                    callback({
-                        "type": "info",
-                        "message": f"Low similarity: {similarity:.1%}",
-                        "files": [file1['filename'], file2['filename']],
-                        "reason": "Below threshold"
-                    })
-
-            # Update progress
-            if progress_queue and comparisons_done % 100 == 0:
-                progress_queue.put({
-                    "status": "processing",
-                    "stage": f"Comparing files ({comparisons_done}/{total_comparisons})",
-                    "progress": (comparisons_done / total_comparisons) * 100,
-                    "currentComparison": {
-                        "user1": file1['user'],
-                        "user2": file2['user'],  # Fixed mismatched quotation
-                        "file1": file1['filename'],
-                        "file2": file2['filename']
-                    }
-                })
-    
-    # Sort results: exact matches first, then by similarity
-    results.sort(key=lambda x: (-int(x.get('is_exact_match', False)), 
-                               -x['similarity'],
-                               len(x.get('similar_segments', []))))
+    # Fingerprint engines replace the exact line-window check
+    check_exact = similarity_threshold > 0.4 and engine == 'lines'
+    owners = [file['user'] for file in all_files]
+    with metrics.stage('candidates'):
+        candidate_pairs = find_candidate_pairs(
+            all_files, similarity_threshold, check_exact,
+            strategy=candidate_strategy,
+            num_permutations=num_permutations,
+            lsh_bands=lsh_bands
+        )
+
+    cross_user_pairs = count_cross_user_pairs(owners)
+    corpus_counts = None
+    if baseline_paths:
+        # What a full check of baseline and new files compares, for merge_reports
+        corpus_counts = {
+            'total_comparisons': len(candidate_pairs),
+            'pruned_comparisons': cross_user_pairs - len(candidate_pairs)
+        }
+        # Pairs between two baseline files were compared in an earlier run
+        candidate_pairs = [
+            (i, j) for i, j in candidate_pairs
+            if all_files[i]['is_new'] or all_files[j]['is_new']
+        ]
+        cross_user_pairs -= count_cross_user_pairs(
+            [file['user'] for file in all_files if not file['is_new']]
+        )
+    if completed_rows:
+        # Rows compared by an earlier, interrupted run
+        remaining = [(i, j) for i, j in candidate_pairs if row_key(all_files[i]) not in completed_rows]
+        metrics.count('pairs_resumed', len(candidate_pairs) - len(remaining))
+        cross_user_pairs -= len(candidate_pairs) - len(remaining)
+        candidate_pairs = remaining
+    total_comparisons = len(candidate_pairs)
+    reporter = ProgressReporter(total_comparisons, progress_queue, callback,
+                                interval=progress_interval, verbosity=verbosity)
+    significant_matches = 0
     
     # Limit results more aggressively for very low thresholds
     max_results = min(batch_size, 100 if similarity_threshold < 0.3 else batch_size)
+    # Best results so far, with the lowest ranked one at the root
+    top_results = []
+
+    # Original text is only read back for pairs that produce a result; a small
+    # LRU avoids re-reading a file that matches several others in a row
+    @lru_cache(maxsize=CONTENT_CACHE_FILES)
+    def file_content(index):
+        with metrics.stage('read_back'):
+            return load_file_content(all_files[index])
+
+    def keep_result(i, j, result):
+        nonlocal significant_matches
+        significant_matches += 1
+        if match_callback:
+            match_callback(result)
+        entry = (worst_first_key(result, i, j), i, j, result)
+        if len(top_results) < max_results:
+            heapq.heappush(top_results, entry)
+        elif top_results and entry[0] > top_results[0][0]:
+            heapq.heapreplace(top_results, entry)
+        else:
+            return
+        if result_callback:
+            result_callback(result)
+
+    def finish_pair(i, j, result, event, seconds):
+        if result is not None:
+            keep_result(i, j, result)
+        metrics.pair_time(seconds, all_files[i], all_files[j])
+        reporter.record(event)
+
+    if workers > 1 and len(candidate_pairs) > 1:
+        # Several blocks per worker keep the pool busy when rows differ in cost.
+        # Workers read sources back themselves (in-memory uploads are pickled
+        # with their content), so they return finished results.
+        blocks = split_pair_blocks(candidate_pairs, workers * 4)
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_comparison_worker,
+                                 initargs=(all_files,), mp_context=POOL_CONTEXT) as executor:
+            futures = {
+                executor.submit(compare_pair_block, block, similarity_threshold, check_exact,
+                                verbosity == 'verbose'): block
+                for block in blocks
+            }
+            for future in as_completed(futures):
+                compared, counts, worker_metrics = future.result()
+                # Stage times are summed over the workers
+                metrics.merge(worker_metrics)
+                for i, j, result, event, seconds in compared:
+                    finish_pair(i, j, result, event, seconds)
+                reporter.add_counts(counts)
+                block = futures[future]
+                if row_callback:
+                    # Blocks hold whole rows (see split_pair_blocks)
+                    row_callback([row_key(all_files[i]) for i in sorted({i for i, _ in block})], len(block))
+                i, j = block[-1]
+                reporter.advance(len(block), all_files[i], all_files[j])
+    else:
+        # Compare candidate pairs in (i, j) order without redundancy
+        row_pairs = 0
+        for index, (i, j) in enumerate(candidate_pairs):
+            start = time.perf_counter()
+            outcome, event = compare_file_pair(all_files[i], all_files[j], similarity_threshold, check_exact)
+            metrics.add_time('compare', time.perf_counter() - start)
+            result = None
+            if outcome is not None:
+                result, event = render_result(
+                    all_files[i], all_files[j], outcome,
+                    file_content(i), file_content(j), similarity_threshold, metrics
+                )
+            finish_pair(i, j, result, event, time.perf_counter() - start)
+            row_pairs += 1
+            if row_callback and (index + 1 == len(candidate_pairs) or candidate_pairs[index + 1][0] != i):
+                row_callback([row_key(all_files[i])], row_pairs)
+                row_pairs = 0
+            reporter.advance(1, all_files[i], all_files[j])
+    reporter.finish()
+
+    # Sort results: exact matches first, then by similarity, then pair order
+    results = []
+    files = FileTable()
+    for _, i, j, result in sorted(top_results, reverse=True):
+        if result_format == 'compact':
+            results.append(compact_result(
+                result,
+                files.file_id(all_files[i]['user'], all_files[i]['filename'], partial(file_content, i)),
+                files.file_id(all_files[j]['user'], all_files[j]['filename'], partial(file_content, j))
+            ))
+        else:
+            # Copies: streamed results must stay without code
+            results.append({**result, 'originalCode1': file_content(i), 'originalCode2': file_content(j)})
+
+    metrics.count('pairs_compared', reporter.done)
+    metrics.count('pairs_pruned', cross_user_pairs - reporter.done)
+    metrics.count('significant_matches', significant_matches)
+    metrics.add_time('total', time.perf_counter() - started)
     
-    return {
+    report = {
         "timestamp": datetime.now().isoformat(),
-        "results": results[:max_results],
+        "results": results,
         "summary": {
             "total_submissions": len(users),
             "total_files": len(all_files),
-            "total_comparisons": comparisons_done,
-            "significant_matches": len(results),
-            "threshold_used": similarity_threshold
+            "total_comparisons": reporter.done,
+            "pruned_comparisons": cross_user_pairs - reporter.done,
+            "significant_matches": significant_matches,
+            "threshold_used": similarity_threshold,
+            "engine": engine,
+            "boilerplate_threshold": boilerplate_threshold,
+            "ignored_boilerplate": len(boilerplate),
+            "metrics": metrics.as_dict()
         }
     }
+    if corpus_counts is not None:
+        report["summary"]["corpus"] = corpus_counts
+    if result_format == 'compact':
+        report["files"] = files.files
+    return report
+
+def merge_reports(previous, update, batch_size=1000, significant_matches=None):
+    """Merge an incremental check into a previously stored report.
+
+    Stored results involving a user from the update are replaced, since the
+    update re-compared those users against the whole corpus. Counts are not
+    adjusted but recomputed: comparisons are those a full check of the
+    corpus makes (summary['corpus'] of the update), and significant_matches
+    comes from the caller, which tracks matches per user pair.
+    """
+    if not previous:
+        return update
+    
+    new_users = set(update.get('new_users', []))
+    kept = [
+        result for result in previous['results']
+        if result['user1'] not in new_users and result['user2'] not in new_users
+    ]
+    results = kept + update['results']
+    results.sort(key=result_sort_key)
+    
+    threshold = update['summary']['threshold_used']
+    max_results = min(batch_size, 100 if threshold < 0.3 else batch_size)
+    summary = dict(update['summary'])
+    # Without baseline files the update was a full check already
+    summary.update(summary.pop('corpus', {}))
+    if significant_matches is not None:
+        summary['significant_matches'] = significant_matches
+    
+    return {
+        "timestamp": update['timestamp'],
+        "results": results[:max_results],
+        "summary": summary
+    }
+
+def check_corpus_submissions(corpus, zip_paths, similarity_threshold=0.7, batch_size=1000, **options):
+    """Add submissions to an assignment corpus and compare only what changed.
+
+    New zips are compared against each other and against the stored corpus,
+    then merged into the stored report. When no report exists yet, or it
+    used a different threshold, engine or boilerplate threshold, the whole
+    corpus is checked again. The corpus templates are always subtracted.
+    The stored report is always in the full format; result_format only
+    applies to the returned one. Updates of one corpus run one at a time.
+    Significant matches are kept per user pair (corpus match counts) so the
+    merged count drops exactly those of re-uploaded users.
+    """
+    result_format = options.pop('result_format', 'full')
+    match_callback = options.pop('match_callback', None)
+    match_counts = Counter()
+    
+    def count_match(result):
+        match_counts[tuple(sorted((result['user1'], result['user2'])))] += 1
+        if match_callback:
+            match_callback(result)
+    
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown result format: {result_format}")
+    # Concurrent uploads to one assignment would drop each other's pairs
+    with corpus.lock():
+        added = corpus.add_submissions(zip_paths)
+        previous = corpus.load_report()
+        if previous and (previous['summary']['threshold_used'] != similarity_threshold
+                         or previous['summary'].get('engine', 'lines') != options.get('engine', 'lines')
+                         or previous['summary'].get('boilerplate_threshold') != options.get('boilerplate_threshold')):
+            previous = None
+        stored_counts = corpus.load_match_counts() if previous else None
+        if stored_counts is None:
+            # Reports stored without match counts are checked again in full
+            previous = None
+    
+        if previous:
+            baseline = [path for path in corpus.submission_paths() if path not in added]
+        else:
+            added, baseline = corpus.submission_paths(), []
+    
+        update = check_plagiarism_files(
+            added,
+            similarity_threshold=similarity_threshold,
+            batch_size=batch_size,
+            baseline_paths=baseline,
+            template_paths=corpus.template_paths(),
+            match_callback=count_match,
+            **options
+        )
+        update['new_users'] = [path.stem for path in added]
+    
+        if previous:
+            new_users = set(update['new_users'])
+            match_counts.update({
+                pair: count for pair, count in stored_counts.items()
+                if pair[0] not in new_users and pair[1] not in new_users
+            })
+        report = merge_reports(previous, update, batch_size=batch_size,
+                               significant_matches=sum(match_counts.values()))
+        report.pop('new_users', None)
+        corpus.save_match_counts(match_counts)
+        corpus.save_report(report)
+    return compact_report(report) if result_format == 'compact' else report
 
 def get_detailed_comparison(code1, code2, normalized1, normalized2):
-    """Get detailed comparison information between two code snippets"""
+    """Get detailed comparison information between two code snippets
+
+    Each normalized line of file 1 is looked up in a line -> first position
+    map of file 2; a match continues the current segment when it lands
+    right after it in file 2.
+    """
     lines1 = code1.splitlines()
     lines2 = code2.splitlines()
     norm_lines1 = normalized1.splitlines()
     norm_lines2 = normalized2.splitlines()
     
+    # First position of every normalized line of file 2
+    first_positions = {}
+    for j, line in enumerate(norm_lines2):
+        first_positions.setdefault(line, j)
+    
     matching_segments = []
     current_match = None
+    current_code = []
     
-    for i in range(len(norm_lines1)):
-        for j in range(len(norm_lines2)):
-            if norm_lines1[i] == norm_lines2[j]:
-                if current_match and current_match['start2'] + current_match['length'] == j:
-                    # Continue existing match
-                    current_match['length'] += 1
-                    current_match['code'] += '\n' + lines1[i]
-                else:
-                    # Start new match
-                    if current_match:
-                        matching_segments.append(current_match)
-                    current_match = {
-                        'start1': i,
-                        'start2': j,
-                        'length': 1,
-                        'code': lines1[i]
-                    }
-                break
-        else:
+    def close_match():
+        current_match['code'] = '\n'.join(current_code)
+        matching_segments.append(current_match)
+    
+    for i, line in enumerate(norm_lines1):
+        j = first_positions.get(line)
+        if j is None:
             if current_match:
-                matching_segments.append(current_match)
+                close_match()
                 current_match = None
+        elif current_match and current_match['start2'] + current_match['length'] == j:
+            # Continue existing match
+            current_match['length'] += 1
+            current_code.append(lines1[i])
+        else:
+            # Start new match
+            if current_match:
+                close_match()
+            current_match = {
+                'start1': i,
+                'start2': j,
+                'length': 1,
+                'code': None
+            }
+            current_code = [lines1[i]]
     
     if current_match:
-        matching_segments.append(current_match)
+        close_match()
     
     return {
         'lineMatches': sum(segment['length'] for segment in matching_segments),
@@ -408,8 +1063,8 @@ def get_detailed_comparison(code1, code2, normalized1, normalized2):
 
 def process_comparison(file1, file2, code1, code2, results):
     # Use normalized comparison for similarity check
-    normalized1 = normalize_code(code1)
-    normalized2 = normalize_code(code2)
+    normalized1 = normalize_code(code1, language_for(file1.name))
+    normalized2 = normalize_code(code2, language_for(file2.name))
     similarity = get_similarity(normalized1, normalized2)
     
     if similarity > 0.7:
@@ -448,5 +1103,145 @@ def process_comparison(file1, file2, code1, code2, results):
                 'is_exact_match': False  # Set to False to prevent false plagiarism flags
             })
 
+def collect_zip_paths(inputs):
+    """Submission zips named by directories (searched recursively), zip files or glob patterns.
+
+    Returns {zip path: user name}. Zips found in a directory are named by
+    their path below it (courseA/s1/submission), others by their stem.
+    Raises ValueError when two zips would get the same name.
+    """
+    users = {}
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            matches = [(match, match.relative_to(path).with_suffix('').as_posix()) for match in path.rglob('*')]
+        else:
+            matches = [path] if path.is_file() else [Path(match) for match in glob.glob(item, recursive=True)]
+            matches = [(match, match.stem) for match in matches]
+        for match, user in matches:
+            if match.suffix.lower() == '.zip' and match.is_file():
+                users.setdefault(match, user)
+    
+    owners = {}
+    for path, user in sorted(users.items()):
+        if user in owners:
+            raise ValueError(f"{owners[user]} and {path} would both be checked as user {user}")
+        owners[user] = path
+    return dict(sorted(users.items()))
+
+class ConsoleProgress:
+    """progress_queue stand-in that prints the progress snapshots to stderr"""
+    
+    def put(self, event):
+        if event.get('stage'):
+            print(event['stage'], file=sys.stderr, flush=True)
+
+def run_batch(zip_paths, output, checkpoint_path=None, restart=False, template_paths=(), user_names=None,
+              **options):
+    """Check zip_paths, writing every significant result to output as JSON Lines.
+
+    Completed rows are logged to checkpoint_path (default: output +
+    '.checkpoint'), so running the same check again resumes after an
+    interruption; restart=True starts over. Returns the summary of the run.
+    """
+    output = Path(output)
+    # Changing the worker count or the cache does not change the results
+    check_options = {
+        key: value for key, value in options.items()
+        if key not in ('workers', 'cache', 'progress_interval')
+    }
+    check_options['user_names'] = sorted((str(path), user) for path, user in (user_names or {}).items())
+    checkpoint = BatchCheckpoint(
+        checkpoint_path or output.with_name(output.name + '.checkpoint'),
+        run_fingerprint(list(zip_paths) + list(template_paths), check_options)
+    )
+    resume = (not restart and checkpoint.load() and output.exists()
+              and output.stat().st_size >= checkpoint.output_size)
+    checkpoint.start(resume)
+    if resume:
+        print(f"Resuming after {len(checkpoint.completed_rows)} compared rows", file=sys.stderr)
+    
+    output.parent.mkdir(parents=True, exist_ok=True)
+    pending = []
+    try:
+        with open(output, 'r+b' if resume else 'wb') as out:
+            # Drop matches written after the last checkpoint; their rows run again
+            out.truncate(checkpoint.output_size)
+            out.seek(checkpoint.output_size)
+            
+            def write_rows(rows, pairs):
+                for result in pending:
+                    out.write((json.dumps(result) + '\n').encode('utf-8'))
+                out.flush()
+                checkpoint.record(rows, out.tell(), {'comparisons': pairs, 'matches': len(pending)})
+                pending.clear()
+            
+            report = check_plagiarism_files(
+                zip_paths,
+                progress_queue=ConsoleProgress(),
+                # Every match goes to the output; no top results are kept
+                batch_size=0,
+                template_paths=template_paths,
+                match_callback=pending.append,
+                completed_rows=checkpoint.completed_rows,
+                row_callback=write_rows,
+                user_names=user_names,
+                **options
+            )
+    finally:
+        checkpoint.close()
+    
+    return {
+        **report['summary'],
+        'output': str(output),
+        'resumed': resume,
+        'total_comparisons_all_runs': checkpoint.counters['comparisons'],
+        'matches_written': checkpoint.counters['matches']
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check all submission zips of an archive, writing matches as JSON Lines. "
+                    "Interrupted runs resume from their checkpoint when run again."
+    )
+    parser.add_argument('inputs', nargs='+', help='directories (searched recursively), zip files or glob patterns')
+    parser.add_argument('-o', '--output', type=Path, default=Path('results.jsonl'))
+    parser.add_argument('--checkpoint', type=Path, help='checkpoint log (default: OUTPUT.checkpoint)')
+    parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint and start over')
+    parser.add_argument('--threshold', type=float, default=0.7)
+    parser.add_argument('--engine', default='lines', choices=DETECTION_ENGINES)
+    parser.add_argument('--strategy', default='prefix', choices=CANDIDATE_STRATEGIES)
+    parser.add_argument('--templates', nargs='+', type=Path, default=[], help='lecturer template zips or code files')
+    parser.add_argument('--boilerplate-threshold', type=float)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='processes for extraction, normalization and comparison')
+    parser.add_argument('--cache', type=Path, help='submission cache database shared between runs')
+    parser.add_argument('--progress-interval', type=float, default=10.0, help='seconds between progress lines')
+    args = parser.parse_args(argv)
+    
+    try:
+        user_names = collect_zip_paths(args.inputs)
+    except ValueError as e:
+        parser.error(str(e))
+    if not user_names:
+        parser.error("no submission zips found")
+    print(f"Checking {len(user_names)} submissions", file=sys.stderr)
+    
+    summary = run_batch(
+        list(user_names), args.output,
+        user_names=user_names,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart,
+        template_paths=args.templates,
+        similarity_threshold=args.threshold,
+        engine=args.engine,
+        candidate_strategy=args.strategy,
+        boilerplate_threshold=args.boilerplate_threshold,
+        workers=args.workers,
+        cache=SubmissionCache(args.cache) if args.cache else None,
+        progress_interval=args.progress_interval
+    )
+    print(json.dumps(summary, indent=2))
+
 if __name__ == "__main__":
-    check_plagiarism()
+    main()
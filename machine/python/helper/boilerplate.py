@@ -0,0 +1,95 @@
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from helper.fingerprint import window_index_from_hashes
+
+# Below this many submissions "shared by most submissions" says nothing
+MIN_BOILERPLATE_SUBMISSIONS = 5
+
+
+class BoilerplateIndex:
+    """Shared ignore index of template code for one checking run.
+
+    Holds the compared features (normalized tokens or fingerprint hashes,
+    depending on the engine), exact line-window hashes and statement/
+    fingerprint hashes that come from a lecturer template or occur in most
+    submissions. subtract() removes them from a prepared file before any
+    pairwise work.
+    """
+
+    def __init__(self):
+        self.tokens: Set = set()
+        self.windows: Set[int] = set()
+        self.fingerprints: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.tokens) + len(self.windows) + len(self.fingerprints)
+
+    def add_file(self, file: Dict) -> None:
+        """Ignore everything a prepared template file contains"""
+        self.tokens.update(file['tokens'])
+        self.windows.update(file_windows(file))
+        self.fingerprints.update(file_fingerprints(file))
+
+    def add_frequent(self, files: List[Dict], threshold: float,
+                     min_submissions: int = MIN_BOILERPLATE_SUBMISSIONS) -> None:
+        """Ignore what more than threshold (a fraction) of the submissions share.
+
+        Frequencies count submissions (users), not files, so a student who
+        splits code over several files is not counted twice.
+        """
+        by_user: Dict[str, List[Dict]] = {}
+        for file in files:
+            by_user.setdefault(file['user'], []).append(file)
+        if len(by_user) < min_submissions:
+            return
+
+        limit = threshold * len(by_user)
+        for target, features in ((self.tokens, lambda file: file['tokens']),
+                                 (self.windows, file_windows),
+                                 (self.fingerprints, file_fingerprints)):
+            counts = Counter()
+            for user_files in by_user.values():
+                counts.update(set().union(*(features(file) for file in user_files)))
+            target.update(feature for feature, count in counts.items() if count > limit)
+
+    def subtract(self, file: Dict) -> None:
+        """Drop ignored tokens, line windows and fingerprints from a prepared file"""
+        if self.tokens:
+            file['tokens'] = file['tokens'] - self.tokens
+        if self.windows:
+            windows = file['windows']
+            file['windows'] = window_index_from_hashes(
+                [None if window_hash in self.windows else window_hash for window_hash in windows['hashes']],
+                windows['min_lines']
+            )
+        if self.fingerprints and 'fingerprints' in file:
+            fingerprints = file['fingerprints']
+            kept = [
+                (fingerprint, span)
+                for fingerprint, span in zip(fingerprints['hashes'], fingerprints['spans'])
+                if fingerprint not in self.fingerprints
+            ]
+            file['fingerprints'] = {
+                'hashes': [fingerprint for fingerprint, _ in kept],
+                'spans': [span for _, span in kept]
+            }
+
+
+def file_windows(file: Dict) -> Iterable[int]:
+    return file['windows']['positions'].keys()
+
+
+def file_fingerprints(file: Dict) -> Iterable[int]:
+    return file['fingerprints']['hashes'] if 'fingerprints' in file else ()
+
+
+def build_boilerplate_index(files: List[Dict], template_files: Iterable[Dict] = (),
+                            threshold: Optional[float] = None) -> BoilerplateIndex:
+    """Ignore index from template files and, with a threshold, frequent content"""
+    index = BoilerplateIndex()
+    for file in template_files:
+        index.add_file(file)
+    if threshold is not None:
+        index.add_frequent(files, threshold)
+    return index
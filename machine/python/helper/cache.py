@@ -0,0 +1,87 @@
+import hashlib
+import json
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+# Bump when normalization or fingerprinting changes so stale entries are ignored
+CACHE_VERSION = 9
+
+
+def content_key(data: bytes) -> str:
+    """Content-addressed cache key for a blob (e.g. an uploaded zip)"""
+    return f"v{CACHE_VERSION}:{hashlib.sha256(data).hexdigest()}"
+
+
+class SubmissionCache:
+    """On-disk cache of prepared submissions keyed by content hash.
+
+    Entries are zlib-compressed JSON stored in SQLite. When the total size
+    exceeds max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, payload BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # A connection per call keeps the cache usable from any thread
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        try:
+            return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+        except (zlib.error, ValueError):
+            self.delete(key)
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        """Store a JSON-serializable value and evict old entries if over budget"""
+        payload = zlib.compress(json.dumps(value).encode('utf-8'))
+        if len(payload) > self.max_bytes:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, payload, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time())
+            )
+            self._evict(conn)
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        expired = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM entries WHERE key = ?", expired)
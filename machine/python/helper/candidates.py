@@ -0,0 +1,167 @@
+import math
+from collections import Counter
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Guard against float rounding when deriving prefix lengths from a threshold
+EPSILON = 1e-9
+
+
+def prefix_length(size: int, threshold: float) -> int:
+    """Number of leading (rarest) tokens that must be indexed for a set of this size"""
+    return min(size, size - math.ceil(threshold * size - EPSILON) + 1)
+
+
+def jaccard_candidates(token_sets: Sequence[Set[str]], threshold: float,
+                       groups: Optional[Sequence[Hashable]] = None) -> Set[Tuple[int, int]]:
+    """Return the (i, j) pairs, i < j, whose Jaccard similarity can exceed threshold.
+
+    Uses prefix filtering over an inverted index: tokens are ordered from
+    rarest to most common and only the first prefix_length tokens of each set
+    are indexed. Two sets with Jaccard >= threshold must share a prefix token,
+    so every pair that get_similarity could flag is emitted. Pairs from the
+    same group (e.g. the same user) are never emitted.
+    """
+    count = len(token_sets)
+    if threshold < 0:
+        # Every pair scores above a negative threshold
+        return {
+            (i, j) for i in range(count) for j in range(i + 1, count)
+            if groups is None or groups[i] != groups[j]
+        }
+
+    frequency = Counter(token for tokens in token_sets for token in tokens)
+    rank = {
+        token: position for position, token in
+        enumerate(sorted(frequency, key=lambda token: (frequency[token], token)))
+    }
+
+    # Visit smaller sets first so the size filter only needs one direction
+    order = sorted((i for i in range(count) if token_sets[i]), key=lambda i: len(token_sets[i]))
+    index: Dict[str, List[int]] = {}
+    candidates = set()
+
+    for i in order:
+        size = len(token_sets[i])
+        ordered = sorted(token_sets[i], key=rank.__getitem__)
+        min_size = threshold * size - EPSILON
+        seen = set()
+
+        for token in ordered[:prefix_length(size, threshold)]:
+            for j in index.get(token, ()):
+                if j in seen:
+                    continue
+                seen.add(j)
+                # Jaccard is bounded by the ratio of the set sizes
+                if len(token_sets[j]) < min_size:
+                    continue
+                if groups is not None and groups[i] == groups[j]:
+                    continue
+                candidates.add((j, i) if j < i else (i, j))
+            index.setdefault(token, []).append(i)
+
+    return candidates
+
+
+def shared_key_candidates(key_sets: Iterable[Iterable[Hashable]],
+                          groups: Optional[Sequence[Hashable]] = None) -> Set[Tuple[int, int]]:
+    """Return the (i, j) pairs, i < j, that share at least one key (e.g. a window hash)"""
+    index: Dict[Hashable, List[int]] = {}
+    for i, keys in enumerate(key_sets):
+        for key in set(keys):
+            index.setdefault(key, []).append(i)
+
+    candidates = set()
+    for members in index.values():
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                i, j = members[a], members[b]
+                if groups is None or groups[i] != groups[j]:
+                    candidates.add((i, j))
+    return candidates
+
+
+def lsh_band_count(num_perm: int, threshold: float) -> int:
+    """Pick the number of LSH bands for a signature length and Jaccard threshold.
+
+    With b bands of r rows, pairs start colliding around (1/b) ** (1/r).
+    The band count whose collision point is the highest one not above the
+    threshold is chosen, favouring recall over precision.
+    """
+    best = num_perm
+    for bands in range(num_perm, 0, -1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = bands
+    return best
+
+
+def lsh_candidates(signatures: Sequence[Optional[tuple]], bands: int,
+                   groups: Optional[Sequence[Hashable]] = None) -> Set[Tuple[int, int]]:
+    """Return the (i, j) pairs, i < j, whose MinHash signatures collide in any LSH band"""
+    rows = max(1, next((len(signature) // bands for signature in signatures if signature), 1))
+    band_keys = [
+        [] if signature is None else [
+            (start, signature[start:start + rows])
+            for start in range(0, len(signature) - rows + 1, rows)
+        ]
+        for signature in signatures
+    ]
+    return shared_key_candidates(band_keys, groups)
+
+
+def matrix_candidates(token_ids: Sequence[Sequence[int]], threshold: float,
+                      groups: Optional[Sequence[Hashable]] = None,
+                      block_size: int = 1024) -> Set[Tuple[int, int]]:
+    """Return the (i, j) pairs, i < j, whose Jaccard similarity exceeds threshold.
+
+    Builds a sparse file x token incidence matrix and computes intersections
+    for a block of rows at a time with one sparse matrix product, then applies
+    the threshold and the same-group mask in bulk. Token ids must be unique
+    per file (see helper.vocabulary.TokenVocabulary). Requires NumPy and SciPy.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    count = len(token_ids)
+    if threshold < 0:
+        # Pairs without any shared token also qualify; nothing to prune
+        return jaccard_candidates([set(ids) for ids in token_ids], threshold, groups)
+
+    sizes = np.fromiter((len(ids) for ids in token_ids), dtype=np.int64, count=count)
+    indptr = np.concatenate(([0], np.cumsum(sizes)))
+    indices = np.fromiter(
+        (token_id for ids in token_ids for token_id in ids), dtype=np.int64, count=int(indptr[-1])
+    )
+    vocabulary_size = int(indices.max()) + 1 if len(indices) else 0
+    incidence = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), indices, indptr),
+        shape=(count, vocabulary_size)
+    )
+    transposed = incidence.T.tocsc()
+
+    if groups is not None:
+        group_ids = {}
+        group_codes = np.fromiter(
+            (group_ids.setdefault(group, len(group_ids)) for group in groups), dtype=np.int64, count=count
+        )
+
+    candidates = set()
+    for start in range(0, count, block_size):
+        stop = min(start + block_size, count)
+        intersections = (incidence[start:stop] @ transposed).tocoo()
+        rows = intersections.row + start
+        cols = intersections.col
+        shared = intersections.data.astype(np.float64)
+
+        # Upper triangle only, then the same-group mask
+        keep = cols > rows
+        if groups is not None:
+            keep &= group_codes[rows] != group_codes[cols]
+        rows, cols, shared = rows[keep], cols[keep], shared[keep]
+
+        similarity = shared / (sizes[rows] + sizes[cols] - shared)
+        above = similarity > threshold
+        candidates.update(zip(rows[above].tolist(), cols[above].tolist()))
+    return candidates
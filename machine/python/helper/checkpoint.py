@@ -0,0 +1,102 @@
+import hashlib
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+# Bump when the checkpoint layout changes so old logs are not resumed
+CHECKPOINT_VERSION = 1
+
+
+def run_fingerprint(paths: Iterable[Path], options: Dict) -> str:
+    """Identity of a batch run: its input files (path, size, mtime) and options"""
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class BatchCheckpoint:
+    """Append-only log of the comparison rows a batch run has completed.
+
+    The first line identifies the run (see run_fingerprint); every further
+    line lists rows whose pairs are all compared, together with the size of
+    the results output once their matches were written. A resumed run skips
+    the logged rows and truncates the output to the logged size, so matches
+    of rows that were in progress when the run stopped are not written
+    twice. A torn last line (the process died while writing it) is dropped.
+    """
+
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = Path(path)
+        self.fingerprint = fingerprint
+        self.completed_rows: Set[Tuple[str, str]] = set()
+        self.output_size = 0
+        self.counters: Counter = Counter()
+        self._valid_bytes = 0
+        self._file = None
+
+    def load(self) -> bool:
+        """Read the log of an earlier run with the same fingerprint.
+
+        Returns False, leaving the checkpoint empty, when there is no such
+        log to resume.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return False
+
+        entries = []
+        valid_bytes = 0
+        for line in lines:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                break
+            valid_bytes += len(line)
+        header = entries[0] if entries else {}
+        if header.get('version') != CHECKPOINT_VERSION or header.get('run') != self.fingerprint:
+            return False
+
+        for entry in entries[1:]:
+            self.completed_rows.update(tuple(row) for row in entry['rows'])
+            self.output_size = entry['output_size']
+            self.counters.update(entry['counters'])
+        self._valid_bytes = valid_bytes
+        return True
+
+    def start(self, resume: bool) -> None:
+        """Open the log for appending; without resume any old log is replaced"""
+        if resume:
+            self._file = open(self.path, 'r+b')
+            self._file.truncate(self._valid_bytes)
+            self._file.seek(self._valid_bytes)
+        else:
+            self.completed_rows = set()
+            self.output_size = 0
+            self.counters = Counter()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'wb')
+            self._write({'version': CHECKPOINT_VERSION, 'run': self.fingerprint})
+
+    def record(self, rows: List[Tuple[str, str]], output_size: int, counters: Dict[str, int]) -> None:
+        """Log completed rows once their matches are flushed to the output"""
+        self.completed_rows.update(rows)
+        self.output_size = output_size
+        self.counters.update(counters)
+        self._write({'rows': rows, 'output_size': output_size, 'counters': counters})
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry: Dict) -> None:
+        self._file.write((json.dumps(entry) + '\n').encode('utf-8'))
+        self._file.flush()
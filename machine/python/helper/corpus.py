@@ -0,0 +1,123 @@
+import json
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+ASSIGNMENT_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+# One lock per corpus folder, shared by every AssignmentCorpus of this process
+_corpus_locks: Dict[Path, threading.RLock] = {}
+_corpus_locks_guard = threading.Lock()
+
+
+class AssignmentCorpus:
+    """Persistent store of every submission received for one assignment.
+
+    Layout under root/<assignment_id>:
+        submissions/<user>.zip   latest zip of each user
+        templates/<name>         lecturer template files subtracted from every check
+        index.json               user -> stored zip and upload time
+        report.json              merged plagiarism report for the corpus
+        matches.json             significant matches per user pair behind the report
+    """
+
+    def __init__(self, root: Path, assignment_id: str):
+        if not ASSIGNMENT_ID_PATTERN.match(assignment_id):
+            raise ValueError(f"Invalid assignment id: {assignment_id}")
+        self.assignment_id = assignment_id
+        self.folder = Path(root) / assignment_id
+        self.submission_folder = self.folder / 'submissions'
+        self.template_folder = self.folder / 'templates'
+        self.index_path = self.folder / 'index.json'
+        self.report_path = self.folder / 'report.json'
+        self.matches_path = self.folder / 'matches.json'
+        self.submission_folder.mkdir(parents=True, exist_ok=True)
+        self.template_folder.mkdir(exist_ok=True)
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """Serialize updates of this assignment across threads (e.g. job workers)"""
+        with _corpus_locks_guard:
+            lock = _corpus_locks.setdefault(self.folder.resolve(), threading.RLock())
+        with lock:
+            yield
+
+    def load_index(self) -> Dict[str, Dict]:
+        if not self.index_path.exists():
+            return {}
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_json(self, path: Path, data) -> None:
+        # Write to a unique temporary file first so a crash never leaves half a file
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.folder, suffix='.tmp',
+                                         delete=False) as f:
+            json.dump(data, f)
+        Path(f.name).replace(path)
+
+    def submission_paths(self) -> List[Path]:
+        """Stored zips of every user in the corpus"""
+        return [self.submission_folder / entry['zip'] for entry in self.load_index().values()]
+
+    def add_submissions(self, zip_paths: List) -> List[Path]:
+        """Copy new zips into the corpus, replacing earlier uploads of the same user
+
+        Accepts zip paths or in-memory uploads (helper.extractor.SpooledSubmission).
+        """
+        index = self.load_index()
+        added = []
+        for path in zip_paths:
+            if path.suffix.lower() != '.zip':
+                continue
+            user = path.stem
+            target = self.submission_folder / f"{user}.zip"
+            target.write_bytes(path.read_bytes())
+            index[user] = {'zip': target.name, 'added': datetime.now().isoformat()}
+            added.append(target)
+        self._write_json(self.index_path, index)
+        return added
+
+    def template_paths(self) -> List[Path]:
+        """Stored template files of the assignment"""
+        return sorted(path for path in self.template_folder.iterdir() if path.is_file())
+
+    def add_templates(self, paths: List) -> List[Path]:
+        """Store template files (zips or code files, paths or in-memory uploads)
+
+        The stored report was computed without them, so it is discarded and
+        the next check covers the whole corpus again.
+        """
+        added = []
+        for path in paths:
+            name = Path(path.filename if hasattr(path, 'filename') else path.name).name
+            if not name or name.startswith('.'):
+                continue
+            target = self.template_folder / name
+            target.write_bytes(path.read_bytes())
+            added.append(target)
+        if added and self.report_path.exists():
+            self.report_path.unlink()
+        return added
+
+    def load_report(self) -> Optional[Dict]:
+        if not self.report_path.exists():
+            return None
+        with open(self.report_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_report(self, report: Dict) -> None:
+        self._write_json(self.report_path, report)
+
+    def load_match_counts(self) -> Optional[Dict[Tuple[str, str], int]]:
+        """Significant matches per (user1, user2) pair, None when not recorded"""
+        if not self.matches_path.exists():
+            return None
+        with open(self.matches_path, 'r', encoding='utf-8') as f:
+            return {(user1, user2): count for user1, user2, count in json.load(f)}
+
+    def save_match_counts(self, counts: Dict[Tuple[str, str], int]) -> None:
+        self._write_json(self.matches_path, [[user1, user2, count] for (user1, user2), count in sorted(counts.items())])
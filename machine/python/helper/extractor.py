@@ -1,21 +1,185 @@
 import zipfile
 import io
+import json
+import shutil
+import tempfile
 from pathlib import Path
-from typing import Dict, List
+from typing import BinaryIO, Dict, Iterator, List, Optional, Union
 
-def extract_zip_contents(zip_path: Path) -> List[tuple]:
-    """Extract all code files from a zip file, returns list of (filename, content)"""
-    contents = []
+from helper.metrics import NULL_METRICS, CheckMetrics
+
+CODE_EXTENSIONS = ('.cpp', '.py', '.ipynb')
+
+# Limits applied while extracting, so a single upload cannot exhaust memory
+MAX_MEMBER_BYTES = 5 * 1024 * 1024
+MAX_TOTAL_BYTES = 50 * 1024 * 1024
+
+# Uploads stay in memory up to this size before spilling to a temporary file
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+# Notebooks embed outputs (images, tables) that are dropped on extraction, so
+# their raw JSON may be much larger than a code file
+MAX_NOTEBOOK_BYTES = 50 * 1024 * 1024
+
+# Cell separator in extracted notebook code (the "percent" format used by
+# Jupytext and editors); Python normalization drops it like any comment
+CELL_MARKER = '# %%'
+MARKDOWN_CELL_MARKER = '# %% [markdown]'
+
+class SpooledSubmission:
+    """Uploaded submission zip kept in a spooled buffer instead of a saved file.
+
+    Exposes stem/suffix/read_bytes like a Path and the file API of the
+    buffer, so it can be passed anywhere a submission zip path is expected,
+    including to a process pool (it is pickled with its content).
+    """
+
+    def __init__(self, filename: str, stream: BinaryIO, max_memory: int = SPOOL_MAX_MEMORY):
+        self.filename = filename
+        self.stem = Path(filename).stem
+        self.suffix = Path(filename).suffix
+        # Copy the stream: request streams are closed once the request ends
+        self.buffer = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        shutil.copyfileobj(stream, self.buffer)
+        self.buffer.seek(0)
+
+    def read_bytes(self) -> bytes:
+        self.buffer.seek(0)
+        return self.buffer.read()
+
+    def __reduce__(self):
+        # Pickled by content, so process pool workers can read the upload too
+        return self.__class__, (self.filename, io.BytesIO(self.read_bytes()))
+
+    def __getattr__(self, name):
+        return getattr(self.buffer, name)
+
+def is_binary(data: bytes) -> bool:
+    """Treat content with NUL bytes in its first block as binary"""
+    return b'\0' in data[:8192]
+
+def is_notebook(filename: str) -> bool:
+    return filename.lower().endswith('.ipynb')
+
+def notebook_cells(notebook: Dict) -> List[Dict]:
+    """Cells of a parsed notebook (nbformat 4, or the worksheets of nbformat 3)"""
+    if 'cells' in notebook:
+        return notebook['cells']
+    return [cell for worksheet in notebook.get('worksheets', []) for cell in worksheet.get('cells', [])]
+
+def cell_source(cell: Dict) -> str:
+    source = cell.get('source', cell.get('input', ''))
+    return ''.join(source) if isinstance(source, list) else source
+
+def extract_notebook_code(data: Union[bytes, str], include_markdown: bool = False) -> str:
+    """Code cells of a notebook as one script, each cell preceded by CELL_MARKER.
+
+    Outputs, attachments and metadata are dropped. Markdown cells are kept as
+    comments (so they never count as code) when include_markdown is set.
+    Raises ValueError for content that is not a notebook.
+    """
+    notebook = json.loads(data)
+    if not isinstance(notebook, dict):
+        raise ValueError("Notebook JSON must be an object")
+    
+    lines = []
+    for cell in notebook_cells(notebook):
+        cell_type = cell.get('cell_type')
+        if cell_type == 'code':
+            lines.append(CELL_MARKER)
+            lines.extend(cell_source(cell).splitlines())
+        elif cell_type == 'markdown' and include_markdown:
+            lines.append(MARKDOWN_CELL_MARKER)
+            lines.extend(f"# {line}".rstrip() for line in cell_source(cell).splitlines())
+    return '\n'.join(lines)
+
+def notebook_cell_starts(code: str) -> List[int]:
+    """0-based line of each cell marker in extracted notebook code.
+
+    The cell holding a line is bisect_right(starts, line), counting the
+    extracted cells from 1 in notebook order.
+    """
+    return [
+        number for number, line in enumerate(code.split('\n'))
+        if line == CELL_MARKER or line == MARKDOWN_CELL_MARKER
+    ]
+
+def decode_member(data: bytes, filename: str = '', include_markdown: bool = False) -> str:
+    """Text of a zip member; notebooks are reduced to their code cells"""
+    if is_notebook(filename):
+        return extract_notebook_code(data, include_markdown)
+    return data.decode('utf-8', errors='ignore')
+
+def iter_zip_contents(zip_path: Union[Path, BinaryIO], max_member_bytes: int = MAX_MEMBER_BYTES,
+                      max_total_bytes: int = MAX_TOTAL_BYTES, include_markdown: bool = False,
+                      metrics: Optional[CheckMetrics] = None) -> Iterator[tuple]:
+    """Lazily yield (filename, content) for each code file of a zip file or stream
+
+    Members that are too large or binary are skipped, and extraction stops
+    once max_total_bytes of code has been read. Only one member's content is
+    held at a time. Notebooks are reduced to their code cells (see
+    extract_notebook_code); their raw JSON may be up to MAX_NOTEBOOK_BYTES
+    and only the extracted code counts towards max_total_bytes.
+
+    With metrics, reading and decoding time goes to the 'extract' stage and
+    the bytes_extracted / files_extracted counters.
+    """
+    metrics = metrics or NULL_METRICS
+    total_bytes = 0
     try:
+        if hasattr(zip_path, 'seek'):
+            zip_path.seek(0)
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
             for file_info in zip_ref.filelist:
-                if file_info.filename.endswith(('.cpp', '.py', '.ipynb')):
+                if not file_info.filename.endswith(CODE_EXTENSIONS):
+                    continue
+                notebook = is_notebook(file_info.filename)
+                member_limit = max(max_member_bytes, MAX_NOTEBOOK_BYTES) if notebook else max_member_bytes
+                if file_info.file_size > member_limit:
+                    print(f"Skipping {file_info.filename}: larger than {member_limit} bytes")
+                    continue
+                if not notebook and total_bytes + file_info.file_size > max_total_bytes:
+                    print(f"Stopping extraction of {zip_path}: total size limit reached")
+                    break
+                with metrics.stage('extract'):
                     with zip_ref.open(file_info.filename) as f:
-                        content = f.read().decode('utf-8', errors='ignore')
-                        contents.append((file_info.filename, content))
+                        # Never trust the declared size: read at most one byte past the limit
+                        data = f.read(member_limit + 1)
+                    metrics.count('bytes_extracted', len(data))
+                    if len(data) > member_limit or is_binary(data):
+                        continue
+                    try:
+                        content = decode_member(data, file_info.filename, include_markdown)
+                    except ValueError as e:
+                        print(f"Skipping {file_info.filename}: not a valid notebook ({e})")
+                        continue
+                metrics.count('files_extracted')
+                # Drop the raw notebook JSON before handing out the code
+                del data
+                total_bytes += len(content)
+                if total_bytes > max_total_bytes:
+                    print(f"Stopping extraction of {zip_path}: total size limit reached")
+                    break
+                yield file_info.filename, content
     except Exception as e:
         print(f"Error extracting zip {zip_path}: {e}")
-    return contents
+
+def extract_zip_contents(zip_path: Union[Path, BinaryIO], max_member_bytes: int = MAX_MEMBER_BYTES,
+                         max_total_bytes: int = MAX_TOTAL_BYTES, include_markdown: bool = False) -> List[tuple]:
+    """Extract all code files from a zip file or stream, returns list of (filename, content)"""
+    return list(iter_zip_contents(zip_path, max_member_bytes, max_total_bytes, include_markdown))
+
+def read_zip_member(zip_path: Union[Path, BinaryIO], member: str, include_markdown: bool = False) -> str:
+    """Read back the content of a single member, decoded like iter_zip_contents"""
+    try:
+        if hasattr(zip_path, 'seek'):
+            zip_path.seek(0)
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            with zip_ref.open(member) as f:
+                return decode_member(f.read(), member, include_markdown)
+    except Exception as e:
+        print(f"Error reading {member} from {zip_path}: {e}")
+        return ""
 
 def read_file_content(file_path: Path) -> str:
     """Read content from file"""
@@ -23,7 +187,7 @@ def read_file_content(file_path: Path) -> str:
         if file_path.suffix.lower() == '.zip':
             return "\n".join([content for _, content in extract_zip_contents(file_path)])
         elif file_path.suffix.lower() == '.ipynb':
-            return extract_code_from_ipynb(file_path)
+            return extract_notebook_code(file_path.read_bytes())
         else:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 return f.read()
@@ -0,0 +1,296 @@
+import bisect
+import random
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from helper.extractor import CELL_MARKER, MARKDOWN_CELL_MARKER
+
+# Polynomial rolling hash parameters (Mersenne prime modulus)
+HASH_BASE = 1_000_003
+HASH_MOD = (1 << 61) - 1
+
+# Lines that never count as code in a window: notebook cell separators
+NON_CODE_LINES = frozenset(('', CELL_MARKER, MARKDOWN_CELL_MARKER))
+
+
+def line_hash(line: str) -> int:
+    """Stable hash of a single line (independent of PYTHONHASHSEED)"""
+    return zlib.crc32(line.encode('utf-8', errors='surrogatepass'))
+
+
+def build_window_index(code: str, min_lines: int = 5) -> Dict:
+    """Build a rolling-hash index of every min_lines window of a file.
+
+    Windows made only of whitespace and notebook cell markers are left out of
+    the index, so empty cells never make a match.
+    """
+    return build_line_window_index(code.splitlines(), min_lines)
+
+
+def build_line_window_index(lines: List[str], min_lines: int = 5) -> Dict:
+    """Window index of an already split file (see build_window_index)"""
+    hashes: List[Optional[int]] = []
+    positions: Dict[int, List[int]] = {}
+
+    count = len(lines) - min_lines + 1
+    if count > 0:
+        line_hashes = [line_hash(line) for line in lines]
+        blank = [line.strip() in NON_CODE_LINES for line in lines]
+        top_power = pow(HASH_BASE, min_lines - 1, HASH_MOD)
+
+        window = 0
+        blank_run = 0
+        for t in range(min_lines):
+            window = (window * HASH_BASE + line_hashes[t]) % HASH_MOD
+            blank_run += blank[t]
+
+        for i in range(count):
+            if i:
+                # Roll the window forward by one line
+                window = (window - line_hashes[i - 1] * top_power) % HASH_MOD
+                window = (window * HASH_BASE + line_hashes[i + min_lines - 1]) % HASH_MOD
+                blank_run += blank[i + min_lines - 1] - blank[i - 1]
+
+            if blank_run == min_lines:
+                hashes.append(None)
+                continue
+            hashes.append(window)
+            positions.setdefault(window, []).append(i)
+
+    return {
+        'min_lines': min_lines,
+        'hashes': hashes,
+        'positions': positions
+    }
+
+
+def window_index_from_hashes(hashes: List[Optional[int]], min_lines: int = 5) -> Dict:
+    """Rebuild a window index from stored window hashes (see build_window_index)"""
+    positions: Dict[int, List[int]] = {}
+    for i, window_hash in enumerate(hashes):
+        if window_hash is not None:
+            positions.setdefault(window_hash, []).append(i)
+    return {
+        'min_lines': min_lines,
+        'hashes': hashes,
+        'positions': positions
+    }
+
+
+def match_window_hashes(index1: Dict, index2: Dict) -> List[Tuple[int, int]]:
+    """Find the (start1, start2) positions of windows with equal hashes.
+
+    Only fingerprints are needed; hits must still be confirmed against the
+    text with verify_window_matches.
+    """
+    positions2 = index2['positions']
+    return [
+        (i, j)
+        for i, window_hash in enumerate(index1['hashes'])
+        if window_hash is not None
+        for j in positions2.get(window_hash, ())
+    ]
+
+
+def verify_window_matches(lines1: List[str], lines2: List[str],
+                          positions: List[Tuple[int, int]], min_lines: int = 5) -> List[Dict]:
+    """Turn hash hits into match details, dropping hash collisions"""
+    matches = []
+    for i, j in positions:
+        window1 = lines1[i:i + min_lines]
+        if lines2[j:j + min_lines] != window1:
+            continue
+        window1_str = '\n'.join(window1)
+        matches.append({
+            'segment': window1_str,
+            'segment2': window1_str,
+            'line_count': min_lines,
+            'line_number1': i + 1,
+            'line_number2': j + 1
+        })
+    return matches
+
+
+# MinHash uses universal hashing (a * x + b) mod p with a fixed seed so
+# signatures are reproducible across runs and processes
+MINHASH_PRIME = (1 << 61) - 1
+MINHASH_SEED = 1_234_567
+
+
+def minhash_permutations(num_perm: int, seed: int = MINHASH_SEED) -> List[tuple]:
+    """Deterministic (a, b) coefficients for num_perm hash permutations"""
+    generator = random.Random(seed)
+    return [
+        (generator.randrange(1, MINHASH_PRIME), generator.randrange(0, MINHASH_PRIME))
+        for _ in range(num_perm)
+    ]
+
+
+def minhash_signature(tokens: Iterable[Union[str, int]], permutations: List[tuple]) -> Optional[tuple]:
+    """Fixed-size MinHash signature of a token set, or None for an empty set
+
+    Tokens may be strings or interned integer ids; ids are hashed as-is.
+    """
+    hashed = [token if isinstance(token, int) else line_hash(token) for token in set(tokens)]
+    if not hashed:
+        return None
+    return tuple(
+        min((a * value + b) % MINHASH_PRIME for value in hashed)
+        for a, b in permutations
+    )
+
+
+def find_common_runs(lines1: List[str], lines2: List[str], min_lines: int = 3,
+                     deadline: Optional[float] = None) -> List[Tuple[int, int, int]]:
+    """Find maximal runs of identical lines shared by two files.
+
+    Windows of min_lines lines are hashed once per file and used as anchors;
+    each anchor hit is verified and extended along its diagonal. Returns
+    (start1, start2, length) runs with length >= min_lines. Windows without
+    code (see build_window_index) never anchor a run. When time.monotonic() passes deadline,
+    the runs found so far are returned.
+    """
+    index1 = build_line_window_index(lines1, min_lines)
+    index2 = build_line_window_index(lines2, min_lines)
+    positions2 = index2['positions']
+    # End (exclusive, in file 1) of the last run found on each diagonal
+    diagonal_ends: Dict[int, int] = {}
+    runs = []
+
+    for i, window_hash in enumerate(index1['hashes']):
+        if window_hash is None or window_hash not in positions2:
+            continue
+        for j in positions2[window_hash]:
+            if diagonal_ends.get(i - j, -1) > i:
+                continue  # Inside a run already found on this diagonal
+            if deadline is not None and time.monotonic() > deadline:
+                return runs
+            if lines1[i:i + min_lines] != lines2[j:j + min_lines]:
+                continue
+            length = min_lines
+            while (i + length < len(lines1) and j + length < len(lines2)
+                   and lines1[i + length] == lines2[j + length]):
+                length += 1
+            diagonal_ends[i - j] = i + length
+            runs.append((i, j, length))
+
+    return runs
+
+
+def select_aligned_runs(runs: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """Greedily keep the longest runs that preserve line order in both files.
+
+    Like a diff alignment, kept runs never cross or overlap. Runs that end up
+    directly adjacent in both files are merged. Returned in file order.
+    """
+    kept: List[Tuple[int, int, int]] = []
+    for i, j, length in sorted(runs, key=lambda run: (-run[2], run[0], run[1])):
+        position = bisect.bisect_left(kept, (i, j, length))
+        if position > 0:
+            a, b, size = kept[position - 1]
+            if a + size > i or b + size > j:
+                continue
+        if position < len(kept):
+            a, b, size = kept[position]
+            if i + length > a or j + length > b:
+                continue
+        kept.insert(position, (i, j, length))
+
+    merged: List[Tuple[int, int, int]] = []
+    for i, j, length in kept:
+        if merged:
+            a, b, size = merged[-1]
+            if a + size == i and b + size == j:
+                merged[-1] = (a, b, size + length)
+                continue
+        merged.append((i, j, length))
+    return merged
+
+
+# Winnowing (Schleimer, Wilkerson and Aiken, as used by MOSS): every k-gram
+# of anonymized tokens is hashed and the minimum of each window of w
+# consecutive k-gram hashes is kept. Any shared run of at least
+# WINNOW_K + WINNOW_WINDOW - 1 tokens is guaranteed a common fingerprint.
+# Tokens are single words and symbols with identifiers anonymized, so k is
+# large enough for a k-gram to cover about two statements.
+WINNOW_K = 20
+WINNOW_WINDOW = 10
+
+
+def winnow_fingerprints(lines: List[str], k: int = WINNOW_K, window: int = WINNOW_WINDOW) -> Dict:
+    """Winnowed k-gram fingerprints of a normalized file.
+
+    lines hold the space-separated tokens of each original line (see
+    checker.anonymize_tokens). Returns {'hashes': [...], 'spans': [...]} where
+    each span is the (first, last) 0-based original line covered by the
+    selected k-gram, so matches map back to the source.
+    """
+    token_hashes: List[int] = []
+    token_lines: List[int] = []
+    for number, line in enumerate(lines):
+        for token in line.split():
+            token_hashes.append(line_hash(token))
+            token_lines.append(number)
+
+    hashes: List[int] = []
+    spans: List[Tuple[int, int]] = []
+    count = len(token_hashes) - k + 1
+    if count <= 0:
+        return {'hashes': hashes, 'spans': spans}
+
+    top_power = pow(HASH_BASE, k - 1, HASH_MOD)
+    gram = 0
+    for t in range(k):
+        gram = (gram * HASH_BASE + token_hashes[t]) % HASH_MOD
+    grams = [gram]
+    for i in range(1, count):
+        gram = (gram - token_hashes[i - 1] * top_power) % HASH_MOD
+        gram = (gram * HASH_BASE + token_hashes[i + k - 1]) % HASH_MOD
+        grams.append(gram)
+
+    # Robust winnowing: keep the previous pick while it is still a minimum of
+    # the window, otherwise take the rightmost minimum
+    selected = -1
+    for start in range(max(1, count - window + 1)):
+        end = min(start + window, count)
+        lowest = min(grams[start:end])
+        if selected >= start and grams[selected] == lowest:
+            continue
+        selected = max(p for p in range(start, end) if grams[p] == lowest)
+        hashes.append(lowest)
+        spans.append((token_lines[selected], token_lines[selected + k - 1]))
+
+    return {'hashes': hashes, 'spans': spans}
+
+
+def match_fingerprints(fingerprints1: Dict, fingerprints2: Dict) -> List[Tuple[int, int, int, int]]:
+    """Line ranges (first1, last1, first2, last2) of code shared by two files.
+
+    Fingerprints with equal hashes are paired in order of occurrence, and
+    pairs that follow each other in both files are merged into one range.
+    """
+    positions2: Dict[int, List[int]] = {}
+    for q, fingerprint in enumerate(fingerprints2['hashes']):
+        positions2.setdefault(fingerprint, []).append(q)
+
+    spans1 = fingerprints1['spans']
+    spans2 = fingerprints2['spans']
+    seen: Dict[int, int] = {}
+    ranges: List[Tuple[int, int, int, int]] = []
+    for p, fingerprint in enumerate(fingerprints1['hashes']):
+        occurrences = positions2.get(fingerprint)
+        if not occurrences:
+            continue
+        n = seen.get(fingerprint, 0)
+        seen[fingerprint] = n + 1
+        first1, last1 = spans1[p]
+        first2, last2 = spans2[occurrences[min(n, len(occurrences) - 1)]]
+
+        if ranges:
+            a1, b1, a2, b2 = ranges[-1]
+            if first1 <= b1 + 1 and a2 <= first2 <= b2 + 1:
+                ranges[-1] = (a1, max(b1, last1), a2, max(b2, last2))
+                continue
+        ranges.append((first1, last1, first2, last2))
+    return ranges
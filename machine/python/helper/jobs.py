@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_FINISHED = 'finished'
+JOB_FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """Raised when the scheduler queue is full; the client should retry later"""
+
+
+class Job:
+    """One submitted check and the progress events it has produced.
+
+    Events are kept in an append-only log so any number of watchers can
+    follow the same job, each from its own position. put() mirrors
+    queue.Queue.put, so a job can be passed wherever a progress_queue is
+    expected.
+    """
+
+    def __init__(self, target: Callable, args: tuple, kwargs: Dict, cleanup: Optional[Callable] = None):
+        self.id = uuid.uuid4().hex
+        self.state = JOB_QUEUED
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.events: List[Any] = []
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.cleanup = cleanup
+        self._condition = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.state in (JOB_FINISHED, JOB_FAILED)
+
+    def put(self, event: Any) -> None:
+        """Append a progress event and wake up blocked watchers"""
+        with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    def events_since(self, position: int) -> List[Any]:
+        """Events from position onwards, without blocking (for async watchers)"""
+        return self.events[position:]
+
+    def wait_events(self, position: int, timeout: Optional[float] = None) -> List[Any]:
+        """Block until there are events after position or the job is done"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > position or self.done, timeout)
+            return self.events[position:]
+
+    def set_state(self, state: str) -> None:
+        with self._condition:
+            self.state = state
+            if state == JOB_RUNNING:
+                self.started = time.time()
+            elif state in (JOB_FINISHED, JOB_FAILED):
+                self.finished = time.time()
+                # The arguments may hold large uploads
+                self.args, self.kwargs = (), {}
+            self._condition.notify_all()
+
+    def describe(self) -> Dict:
+        return {
+            'id': self.id,
+            'state': self.state,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'events': len(self.events)
+        }
+
+
+class JobScheduler:
+    """Bounded job queue served by a fixed pool of worker threads.
+
+    At most max_queued jobs wait for a worker; submit() raises JobQueueFull
+    beyond that instead of starting unbounded threads. Each job runs
+    target(job, *args, **kwargs) with the job as its progress channel; the
+    CPU-heavy comparison inside a check runs in its own process pool (see
+    checker.check_plagiarism_files(workers=...)). Finished jobs are kept for
+    retention seconds so late watchers still get their events.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 16, retention: float = 3600):
+        self.retention = retention
+        self.jobs: Dict[str, Job] = {}
+        self._queue: 'queue.Queue[Job]' = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"job-worker-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, target: Callable, *args, cleanup: Optional[Callable] = None, **kwargs) -> Job:
+        """Queue a job, or raise JobQueueFull when the queue is at capacity.
+
+        cleanup() runs once the job is over, whether it succeeded or not.
+        """
+        self._expire()
+        job = Job(target, args, kwargs, cleanup)
+        with self._lock:
+            self.jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self.jobs[job.id]
+            raise JobQueueFull(f"{self._queue.maxsize} jobs are already waiting")
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def running(self) -> int:
+        with self._lock:
+            return sum(1 for job in self.jobs.values() if job.state == JOB_RUNNING)
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            job.set_state(JOB_RUNNING)
+            try:
+                job.target(job, *job.args, **job.kwargs)
+                job.set_state(JOB_FINISHED)
+            except Exception as e:
+                job.put({"status": "error", "message": str(e)})
+                job.set_state(JOB_FAILED)
+            finally:
+                if job.cleanup:
+                    job.cleanup()
+                self._queue.task_done()
+
+    def _expire(self) -> None:
+        """Forget finished jobs older than the retention period"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [job_id for job_id, job in self.jobs.items() if job.done and job.finished < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
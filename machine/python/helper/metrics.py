@@ -0,0 +1,129 @@
+import heapq
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Slowest pairs kept per check
+SLOWEST_PAIRS = 10
+
+
+class CheckMetrics:
+    """Stage durations, counters and the slowest pairs of one checking run.
+
+    Stage durations are summed over every call, so stages timed inside pool
+    workers may add up to more than the wall-clock time.
+    """
+
+    def __init__(self, slowest_pairs: int = SLOWEST_PAIRS):
+        self.stages: Counter = Counter()
+        self.counters: Counter = Counter()
+        self.slowest_pairs = slowest_pairs
+        self._slowest: List[tuple] = []
+        self._pairs_timed = 0
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.stages[name] += seconds
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] += amount
+
+    def merge(self, metrics: Dict) -> None:
+        """Add stage times and counters recorded elsewhere (CheckMetrics.as_dict())"""
+        self.stages.update(metrics.get('stages', {}))
+        self.counters.update(metrics.get('counters', {}))
+
+    def pair_time(self, seconds: float, file1: Dict, file2: Dict) -> None:
+        """Remember a pair if it is among the slowest so far"""
+        self._pairs_timed += 1
+        if len(self._slowest) >= self.slowest_pairs and seconds <= self._slowest[0][0]:
+            return
+        entry = (seconds, self._pairs_timed, {
+            'user1': file1['user'],
+            'user2': file2['user'],
+            'file1': file1['filename'],
+            'file2': file2['filename'],
+            'seconds': round(seconds, 6)
+        })
+        if len(self._slowest) < self.slowest_pairs:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heapreplace(self._slowest, entry)
+
+    def as_dict(self) -> Dict:
+        return {
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'counters': dict(self.counters),
+            'slowest_pairs': [pair for _, _, pair in sorted(self._slowest, reverse=True)]
+        }
+
+
+class NullMetrics(CheckMetrics):
+    """Stand-in that records nothing, for calls made outside a check"""
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        yield
+
+    def add_time(self, name: str, seconds: float) -> None:
+        pass
+
+    def count(self, name: str, amount: int = 1) -> None:
+        pass
+
+    def merge(self, metrics: Dict) -> None:
+        pass
+
+    def pair_time(self, seconds: float, file1: Dict, file2: Dict) -> None:
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+class MetricsRegistry:
+    """Process-wide totals over all finished checks, for a /metrics endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.stages: Counter = Counter()
+        self.counters: Counter = Counter()
+
+    def record(self, metrics: Dict) -> None:
+        """Add the metrics of a finished check (CheckMetrics.as_dict())"""
+        with self._lock:
+            self.checks += 1
+            self.stages.update(metrics.get('stages', {}))
+            self.counters.update(metrics.get('counters', {}))
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition of the totals plus current gauges"""
+        with self._lock:
+            lines = [
+                '# HELP plagiarism_checks_total Finished plagiarism checks.',
+                '# TYPE plagiarism_checks_total counter',
+                f'plagiarism_checks_total {self.checks}',
+                '# HELP plagiarism_stage_seconds_total Time spent per pipeline stage.',
+                '# TYPE plagiarism_stage_seconds_total counter'
+            ]
+            lines.extend(
+                f'plagiarism_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                for name, seconds in sorted(self.stages.items())
+            )
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'# TYPE plagiarism_{name}_total counter')
+                lines.append(f'plagiarism_{name}_total {value}')
+        for name, value in sorted((gauges or {}).items()):
+            lines.append(f'# TYPE plagiarism_{name} gauge')
+            lines.append(f'plagiarism_{name} {value}')
+        return '\n'.join(lines) + '\n'
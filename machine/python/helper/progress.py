@@ -0,0 +1,101 @@
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+
+# Progress verbosity, from least to most events:
+#   quiet    periodic snapshots and the final result
+#   normal   also every detection and streamed match
+#   verbose  also the per-pair info events (skipped, below threshold)
+VERBOSITY_LEVELS = ('quiet', 'normal', 'verbose')
+
+# Event types that are always reported on their own
+DETECTION_TYPES = ('warning', 'detection')
+
+
+def event_category(event: Dict) -> str:
+    """Counter an analysis event contributes to"""
+    if event['type'] == 'warning':
+        return 'exact_matches'
+    if event['type'] == 'detection':
+        return 'detections'
+    if event.get('reason') == 'Below threshold':
+        return 'below_threshold'
+    return 'skipped'
+
+
+def event_level(event: Any) -> str:
+    """Lowest verbosity at which a progress channel event is shown"""
+    if not isinstance(event, dict) or event.get('status') != 'processing' or 'stage' in event:
+        return 'quiet'
+    detail = event.get('analysisDetail')
+    if 'match' in event or (detail and detail.get('type') in DETECTION_TYPES):
+        return 'normal'
+    return 'verbose'
+
+
+def is_visible(event: Any, verbosity: str) -> bool:
+    """Whether a watcher asking for verbosity gets this event"""
+    if verbosity not in VERBOSITY_LEVELS:
+        verbosity = 'normal'
+    return VERBOSITY_LEVELS.index(event_level(event)) <= VERBOSITY_LEVELS.index(verbosity)
+
+
+class ProgressReporter:
+    """Coalesces per-pair progress into snapshots sent at most every interval.
+
+    Outcomes are only counted; a snapshot with the counters and the pair
+    being compared goes to progress_queue when interval seconds have passed
+    since the last one (and once at the end). Detection events go to
+    callback one by one; info events only with verbosity='verbose'.
+    """
+
+    def __init__(self, total: int, progress_queue=None, callback: Optional[Callable] = None,
+                 interval: float = 1.0, verbosity: str = 'normal'):
+        self.total = total
+        self.progress_queue = progress_queue
+        self.callback = callback
+        self.interval = interval
+        self.verbose = verbosity == 'verbose'
+        self.done = 0
+        self.counters: Counter = Counter()
+        self.last_pair = None
+        self.last_sent = time.monotonic()
+
+    def record(self, event: Optional[Dict]) -> None:
+        """Count an analysis event and forward it if it is shown individually"""
+        if not event:
+            return
+        self.counters[event_category(event)] += 1
+        if self.callback and (self.verbose or event['type'] in DETECTION_TYPES):
+            self.callback(event)
+
+    def add_counts(self, counts: Dict[str, int]) -> None:
+        """Add outcomes that were counted elsewhere (e.g. in a worker process)"""
+        self.counters.update(counts)
+
+    def advance(self, pairs: int, file1: Dict, file2: Dict) -> None:
+        """Mark pairs as compared; sends a snapshot when the interval is over"""
+        self.done += pairs
+        self.last_pair = (file1, file2)
+        if self.progress_queue is not None and time.monotonic() - self.last_sent >= self.interval:
+            self.send_snapshot()
+
+    def finish(self) -> None:
+        if self.progress_queue is not None and self.last_pair:
+            self.send_snapshot()
+
+    def send_snapshot(self) -> None:
+        file1, file2 = self.last_pair
+        self.last_sent = time.monotonic()
+        self.progress_queue.put({
+            "status": "processing",
+            "stage": f"Comparing files ({self.done}/{self.total})",
+            "progress": (self.done / self.total) * 100 if self.total else 100,
+            "counters": dict(self.counters),
+            "currentComparison": {
+                "user1": file1['user'],
+                "user2": file2['user'],
+                "file1": file1['filename'],
+                "file2": file2['filename']
+            }
+        })
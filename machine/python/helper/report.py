@@ -0,0 +1,113 @@
+import gzip
+import json
+from typing import Callable, Dict, List, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # Optional: results are served as JSON without it
+    msgpack = None
+
+# 'full' embeds both files' code in every result; 'compact' keeps each file
+# once in a file table that results refer to by id
+RESULT_FORMATS = ('full', 'compact')
+
+# Results per page of the /results endpoint
+RESULTS_PAGE_SIZE = 50
+MAX_RESULTS_PAGE_SIZE = 500
+
+# Text that the file table and line spans already cover
+SOURCE_KEYS = ('originalCode1', 'originalCode2')
+SEGMENT_KEYS = ('segment', 'segment2')
+
+
+class FileTable:
+    """Deduplicated source files of a compact report, keyed by (user, filename)"""
+
+    def __init__(self):
+        self.files: List[Dict] = []
+        self.ids: Dict[Tuple[str, str], int] = {}
+
+    def file_id(self, user: str, filename: str, code: Union[str, Callable[[], str]]) -> int:
+        """Id of the file, adding it on first use; code may be a loader"""
+        key = (user, filename)
+        if key not in self.ids:
+            self.ids[key] = len(self.files)
+            self.files.append({
+                'id': self.ids[key],
+                'user': user,
+                'filename': filename,
+                'code': code() if callable(code) else code
+            })
+        return self.ids[key]
+
+
+def compact_result(result: Dict, file1_id: int, file2_id: int) -> Dict:
+    """A result that refers to the file table instead of embedding source text.
+
+    Match details keep their line spans (line_number1/2, line_count) and
+    cells; their text, and the similar_segments made of it, can be cut out
+    of the file table. Results without match details keep their segments.
+    """
+    compact = {key: value for key, value in result.items() if key not in SOURCE_KEYS}
+    compact['file1_id'] = file1_id
+    compact['file2_id'] = file2_id
+    if 'match_details' in result:
+        compact['match_details'] = [
+            {key: value for key, value in match.items() if key not in SEGMENT_KEYS}
+            for match in result['match_details']
+        ]
+        compact.pop('similar_segments', None)
+    return compact
+
+
+def compact_report(report: Dict) -> Dict:
+    """Convert a full report (originalCode in every result) to the compact format"""
+    if 'files' in report:
+        return report
+    table = FileTable()
+    results = [
+        compact_result(
+            result,
+            table.file_id(result['user1'], result['file1'], result.get('originalCode1', '')),
+            table.file_id(result['user2'], result['file2'], result.get('originalCode2', ''))
+        )
+        for result in report['results']
+    ]
+    return {**report, 'results': results, 'files': table.files}
+
+
+def results_page(report: Dict, page: int = 1, per_page: int = RESULTS_PAGE_SIZE) -> Dict:
+    """One page of a report's results in the compact format.
+
+    Only the files referenced on the page are included; file ids are those
+    of the whole report, so pages can share a client-side file cache.
+    """
+    report = compact_report(report)
+    per_page = min(max(1, per_page), MAX_RESULTS_PAGE_SIZE)
+    page = max(1, page)
+    results = report['results'][(page - 1) * per_page:page * per_page]
+    referenced = sorted({result[key] for result in results for key in ('file1_id', 'file2_id')})
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total_results': len(report['results']),
+        'total_pages': -(-len(report['results']) // per_page),
+        'summary': report.get('summary'),
+        'results': results,
+        'files': [report['files'][file_id] for file_id in referenced]
+    }
+
+
+def encode_payload(data: Dict, binary: bool = False, compress: bool = False) -> Tuple[bytes, str]:
+    """Serialize a response body as (bytes, mimetype).
+
+    binary selects MessagePack when the msgpack package is installed, JSON
+    otherwise; compress gzips the body (to be sent with Content-Encoding).
+    """
+    if binary and msgpack is not None:
+        body, mimetype = msgpack.packb(data, use_bin_type=True), 'application/msgpack'
+    else:
+        body, mimetype = json.dumps(data).encode('utf-8'), 'application/json'
+    if compress:
+        body = gzip.compress(body, compresslevel=6)
+    return body, mimetype
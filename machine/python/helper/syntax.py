@@ -0,0 +1,131 @@
+import ast
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from helper.fingerprint import HASH_BASE, HASH_MOD
+
+# Subtrees smaller than this (names, constants, a bare call) occur in every
+# program and would only add noise to the similarity
+MIN_SUBTREE_NODES = 4
+
+# Fields holding identifiers that a copier can rename freely. Attribute and
+# keyword names are kept since they name library APIs.
+ANONYMIZED_FIELDS = {
+    'Name': ('id',),
+    'arg': ('arg',),
+    'FunctionDef': ('name',),
+    'AsyncFunctionDef': ('name',),
+    'ClassDef': ('name',),
+    'alias': ('asname',),
+    'ExceptHandler': ('name',),
+    'Global': ('names',),
+    'Nonlocal': ('names',),
+}
+
+
+def node_digest(label: str, child_hashes: Iterable[int]) -> int:
+    """Stable 64-bit hash of a node label and its children's hashes"""
+    digest = hashlib.blake2b(label.encode('utf-8', errors='surrogatepass'), digest_size=8)
+    for child_hash in child_hashes:
+        digest.update(child_hash.to_bytes(8, 'little'))
+    return int.from_bytes(digest.digest(), 'little')
+
+
+def node_label(node: ast.AST) -> str:
+    """Node type plus its primitive fields, with identifiers and constants anonymized"""
+    name = type(node).__name__
+    if isinstance(node, ast.Constant):
+        return f"{name}:{type(node.value).__name__}"
+    anonymized = ANONYMIZED_FIELDS.get(name, ())
+    parts = [name]
+    for field, value in ast.iter_fields(node):
+        if field in anonymized or isinstance(value, (ast.AST, list)) or value is None:
+            continue
+        parts.append(f"{field}={value}")
+    return ':'.join(parts)
+
+
+def subtree_fingerprints(code: str, cell_starts: Optional[List[int]] = None) -> Optional[Dict]:
+    """Hash every subtree of a Python file's syntax tree.
+
+    Returns None when the code does not parse. Otherwise returns
+    {'hashes': [...], 'statements': {'hashes': [...], 'spans': [...]}}:
+    the hashes of all subtrees of at least MIN_SUBTREE_NODES nodes (a
+    multiset), and the hash and (first, last) 0-based line span of every
+    statement in source order, in the format of
+    helper.fingerprint.match_fingerprints.
+
+    With cell_starts (helper.extractor.notebook_cell_starts) every notebook
+    cell is parsed on its own, so a cell with IPython magics or shell lines
+    is skipped instead of the whole notebook; None then means no cell parsed.
+    """
+    lines = code.split('\n')
+    bounds = [-1] + list(cell_starts or []) + [len(lines)]
+    hashes: List[int] = []
+    statements: List[Tuple[int, int, int]] = []
+    parsed = False
+
+    for marker, end in zip(bounds, bounds[1:]):
+        offset = marker + 1
+        if cell_starts and offset >= end:
+            continue
+        try:
+            tree = ast.parse('\n'.join(lines[offset:end]))
+            cell_hashes, cell_statements = tree_fingerprints(tree, offset)
+        except (SyntaxError, ValueError, RecursionError):
+            continue
+        hashes.extend(cell_hashes)
+        statements.extend(cell_statements)
+        parsed = True
+    if not parsed:
+        return None
+
+    statements.sort()
+    return {
+        'hashes': hashes,
+        'statements': {
+            'hashes': [node_hash for _, _, node_hash in statements],
+            'spans': [(first, -negative_last) for first, negative_last, _ in statements]
+        }
+    }
+
+
+def tree_fingerprints(tree: ast.AST, offset: int = 0) -> Tuple[List[int], List[Tuple[int, int, int]]]:
+    """Subtree hashes and (first, -last, hash) statements of one tree, lines shifted by offset"""
+    hashes: List[int] = []
+    statements: List[Tuple[int, int, int]] = []
+
+    def visit(node: ast.AST) -> Tuple[int, int]:
+        child_hashes = []
+        size = 1
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.expr_context):
+                continue
+            child_hash, child_size = visit(child)
+            child_hashes.append(child_hash)
+            size += child_size
+        node_hash = node_digest(node_label(node), child_hashes)
+        if size >= MIN_SUBTREE_NODES:
+            hashes.append(node_hash)
+        if isinstance(node, ast.stmt):
+            last = getattr(node, 'end_lineno', None) or node.lineno
+            statements.append((offset + node.lineno - 1, -(offset + last - 1), node_hash))
+        return node_hash, size
+
+    visit(tree)
+    return hashes, statements
+
+
+def multiset_features(hashes: Iterable[int]) -> Set[int]:
+    """Turn a hash multiset into a set whose Jaccard is the multiset Jaccard.
+
+    The n-th occurrence of a hash becomes its own feature, so the set
+    intersection counts min(count1, count2) per hash.
+    """
+    occurrences: Dict[int, int] = {}
+    features = set()
+    for value in hashes:
+        n = occurrences.get(value, 0)
+        occurrences[value] = n + 1
+        features.add((value * HASH_BASE + n) % HASH_MOD)
+    return features
@@ -0,0 +1,69 @@
+from array import array
+from typing import Dict, FrozenSet, Iterable, List, Optional, Union
+
+# Largest vocabulary for which files get bitsets (8 KB per file at most);
+# above it they get a frozenset of their ids instead
+BITSET_MAX_VOCABULARY = 1 << 16
+
+
+class TokenVocabulary:
+    """Shared token -> integer id mapping for one checking run"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.tokens: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def intern(self, tokens: Iterable[str]) -> array:
+        """Map a token set to a sorted array of int ids
+
+        Tokens are interned in sorted order so ids do not depend on set
+        iteration order (string hashing is randomized per process).
+        """
+        ids = self.ids
+        interned = []
+        for token in sorted(tokens):
+            token_id = ids.get(token)
+            if token_id is None:
+                token_id = ids[token] = len(self.tokens)
+                self.tokens.append(token)
+            interned.append(token_id)
+        interned.sort()
+        return array('i', interned)
+
+
+def token_bitset(token_ids: array, vocabulary_size: int) -> int:
+    """Pack token ids into an int with one bit per vocabulary entry"""
+    bits = bytearray((vocabulary_size + 7) // 8)
+    for token_id in token_ids:
+        bits[token_id >> 3] |= 1 << (token_id & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def token_lookup(token_ids: array, vocabulary_size: int) -> Union[int, FrozenSet[int]]:
+    """Structure id_similarity intersects, built once per file: a bitset or a frozenset"""
+    if vocabulary_size <= BITSET_MAX_VOCABULARY:
+        return token_bitset(token_ids, vocabulary_size)
+    return frozenset(token_ids)
+
+
+def id_similarity(ids1: array, ids2: array, lookup1: Union[int, FrozenSet[int], None] = None,
+                  lookup2: Union[int, FrozenSet[int], None] = None) -> float:
+    """Jaccard similarity of two interned token sets.
+
+    Intersects the lookups of token_lookup (a popcount for bitsets) when
+    given, otherwise the id arrays; the union size is derived from the set
+    sizes either way.
+    """
+    if not ids1 or not ids2:
+        return 0.0
+    if lookup1 is not None and lookup2 is not None:
+        shared = lookup1 & lookup2
+        intersection = shared.bit_count() if isinstance(shared, int) else len(shared)
+    else:
+        if len(ids1) > len(ids2):
+            ids1, ids2 = ids2, ids1
+        intersection = len(set(ids1).intersection(ids2))
+    return intersection / (len(ids1) + len(ids2) - intersection)